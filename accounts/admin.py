@@ -1,9 +1,25 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.sites.shortcuts import get_current_site
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.text import smart_split, unescape_string_literal
 from django.utils.translation import gettext_lazy as _
 
+from .bulk import bulk_force_password_reset, bulk_resend_confirmation, bulk_set_active
+from .changelists import EstimatedCountPaginator, KeysetChangeList
+from .export import export_response
 from .forms import CustomUserCreationForm, CustomUserChangeForm
-from .models import User, Profile
+from .models import User, Profile, OutgoingEmail
+
+
+def prefix_range(field, term):
+    """
+    Return a Q matching values of field that start with term, written as
+    a range so it can be answered by a plain index.
+    """
+    # Every string starting with term sorts between term and term + U+FFFF.
+    return Q(**{f"{field}__gte": term, f"{field}__lt": term + "\uffff"})
 
 
 @admin.register(User)
@@ -12,7 +28,7 @@ class UserAdmin(UserAdmin):
     form = CustomUserChangeForm
     model = User
     list_display = ("email", "username", "is_staff", "is_active",)
-    list_filter = ("email", "is_staff", "is_active",)
+    list_filter = ("is_staff", "is_active", "is_superuser",)
     fieldsets = (
         (_("Personal info"), {"fields": ("email", "username", "password")}),
         (_("Permissions"), {
@@ -33,8 +49,62 @@ class UserAdmin(UserAdmin):
             )}
         ),
     )
-    search_fields = ("email",)
-    ordering = ["email"]
+    search_fields = ("email", "username",)
+    # Keyset pagination pages by primary key, so column sorting is disabled.
+    ordering = ["-pk"]
+    sortable_by = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [
+        "activate_users", "deactivate_users", "force_password_reset", "resend_confirmation",
+        "export_csv", "export_jsonl",
+    ]
+    
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+    
+    @admin.action(description=_("Activate selected users"), permissions=["change"])
+    def activate_users(self, request, queryset):
+        count = bulk_set_active(queryset, True)
+        self.message_user(request, _("Activated %d user(s).") % count)
+    
+    @admin.action(description=_("Deactivate selected users"), permissions=["change"])
+    def deactivate_users(self, request, queryset):
+        count = bulk_set_active(queryset, False)
+        self.message_user(request, _("Deactivated %d user(s).") % count)
+    
+    @admin.action(description=_("Force a password reset of selected users"), permissions=["change"])
+    def force_password_reset(self, request, queryset):
+        count = bulk_force_password_reset(queryset, get_current_site(request).domain)
+        self.message_user(request, _("Reset the password of %d user(s) and queued their emails.") % count)
+    
+    @admin.action(description=_("Resend the confirmation email to selected users"), permissions=["change"])
+    def resend_confirmation(self, request, queryset):
+        count = bulk_resend_confirmation(queryset, get_current_site(request).domain)
+        self.message_user(request, _("Queued %d confirmation email(s).") % count)
+    
+    @admin.action(description=_("Export selected users with their profiles (CSV)"), permissions=["view"])
+    def export_csv(self, request, queryset):
+        return export_response(queryset, "csv")
+    
+    @admin.action(description=_("Export selected users with their profiles (JSONL)"), permissions=["view"])
+    def export_jsonl(self, request, queryset):
+        return export_response(queryset, "jsonl")
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match the search term as a prefix of the lowercased email or
+        username. Prefixes are searched as index range scans instead of
+        the default unindexed icontains.
+        """
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        
+        condition = prefix_range("email_lower", term)
+        if "@" not in term:
+            condition |= prefix_range("username_lower", term)
+        return queryset.filter(condition), False
 
 
 @admin.register(Profile)
@@ -43,6 +113,50 @@ class ProfileAdmin(admin.ModelAdmin):
         "user", "first_name", "last_name",
         "gender", "created_at", "updated_at"
     ]
-    search_fields = ["user", "first_name", "last_name"]
+    # "user" is rendered through Profile.__str__, join it into the page query.
+    list_select_related = ["user"]
+    search_fields = ["user__email", "first_name", "last_name"]
     list_filter = ["gender", "created_at", "updated_at"]
+    # Keyset pagination pages by primary key, so column sorting is disabled.
+    ordering = ["-pk"]
+    sortable_by = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Split the search into words like Django's default search, quoted
+        phrases included, and return the profiles matching every word as a
+        case-insensitive prefix of the user's email, first name or last
+        name, using the lowercased email and name indexes. Words containing
+        "@" only match emails.
+        """
+        words = []
+        for bit in smart_split(search_term.lower()):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            if bit:
+                words.append(bit)
+        if not words:
+            return queryset, False
+        
+        queryset = queryset.alias(
+            first_name_lower=Lower("first_name"),
+            last_name_lower=Lower("last_name"),
+        )
+        for word in words:
+            condition = prefix_range("user__email_lower", word)
+            if "@" not in word:
+                condition |= prefix_range("first_name_lower", word) | prefix_range("last_name_lower", word)
+            queryset = queryset.filter(condition)
+        return queryset, False
+
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ["to_email", "subject", "status", "attempts", "next_attempt_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["to_email"]
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_in
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save
+
+        from .last_login import record_last_login
+        from .metrics import install_sql_instrumentation
+        from .sqlite import configure_sqlite_connection
+        from .usernames import index_saved_username
+
+        connection_created.connect(install_sql_instrumentation, dispatch_uid="accounts_sql_metrics")
+        connection_created.connect(configure_sqlite_connection, dispatch_uid="accounts_sqlite_pragmas")
+        post_save.connect(index_saved_username, sender="accounts.User", dispatch_uid="accounts_username_index")
+        # Replaces django.contrib.auth's update_last_login.
+        user_logged_in.disconnect(dispatch_uid="update_last_login")
+        user_logged_in.connect(record_last_login, dispatch_uid="accounts_record_last_login")
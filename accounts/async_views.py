@@ -0,0 +1,130 @@
+"""
+Async versions of the account views, used when ACCOUNTS_ASYNC_VIEWS is
+enabled and the project is served over ASGI.
+
+Django 3.2 has no async ORM API, so database calls go through
+sync_to_async, and password hashing runs in the bounded pool from
+accounts.hashing instead of on the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from django.contrib.auth import login
+from django.utils.http import urlsafe_base64_decode
+from django.utils.encoding import force_str
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+
+from .forms import (
+    UserLoginForm,
+    CustomUserCreationForm,
+    CustomSetPasswordForm,
+    CustomPasswordResetForm,
+)
+from .decorators import user_not_authenticated
+from .hashing import run_hashing
+from .routers import get_from_primary_if_missing
+from .token import account_activation_token
+from .sqlite import run_write
+from .views import create_account, handle_auth_error, send_password_reset_email
+
+
+UserModel = get_user_model()
+
+# Rendering reads the session through the messages context processor.
+arender = sync_to_async(render)
+
+
+async def get_user_from_uid(uidb64):
+    try:
+        uid = force_str(urlsafe_base64_decode(uidb64))
+        return await sync_to_async(get_from_primary_if_missing)(UserModel.objects.all(), pk=uid)
+    except (TypeError, ValueError, OverflowError, UserModel.DoesNotExist, ValidationError):
+        return None
+
+
+async def activate(request, uidb64, token):
+    """
+    Activates a user account.
+    See accounts.views.activate.
+    """
+    user = await get_user_from_uid(uidb64)
+    if user is not None and account_activation_token.check_token(user, token):
+        user.is_active = True
+        await sync_to_async(run_write)(user.save, update_fields=["is_active"])
+        messages.success(
+            request,
+            "Your account has been successfully verified. "
+            "Now you can login your account."
+        )
+        return redirect("/login/")
+    else:
+        messages.error(request, "The confirmation email has expired.")
+    return redirect("/")
+
+
+@user_not_authenticated
+async def login_view(request):
+    form = UserLoginForm()
+
+    if request.method == "POST":
+        form = UserLoginForm(request, data=request.POST)
+        # The user lookup and the password hash both run in the hashing pool.
+        if await run_hashing(form.is_valid):
+            await sync_to_async(login)(request, form.get_user())
+            messages.success(request, "You have successfully logged in.")
+            next_url = request.POST.get("next")
+            return redirect(next_url or "/")
+        else:
+            await sync_to_async(handle_auth_error)(request, form)
+
+    return await arender(request, "login-page.html", {"form": form})
+
+
+@user_not_authenticated
+async def register_view(request):
+    form = CustomUserCreationForm()
+    if request.method == "POST":
+        form = CustomUserCreationForm(request.POST)
+        if await sync_to_async(form.is_valid)():
+            # save(commit=False) only hashes the password.
+            user = await run_hashing(form.save, commit=False)
+            await sync_to_async(run_write)(create_account, request, user)
+            return redirect("/")
+
+    return await arender(request, "register-page.html", {"form": form})
+
+
+@user_not_authenticated
+async def password_reset_request(request):
+    form = CustomPasswordResetForm()
+    if request.method == "POST":
+        form = CustomPasswordResetForm(request.POST)
+        if form.is_valid():
+            user_email = form.cleaned_data["email"]
+            user = await sync_to_async(UserModel.objects.filter(email=user_email).first)()
+            if user:
+                await sync_to_async(send_password_reset_email)(request, user)
+            return redirect("/")
+
+    return await arender(request, "password_reset.html", {"form": form})
+
+
+async def password_reset_confirm(request, uidb64, token):
+    user = await get_user_from_uid(uidb64)
+
+    if user and account_activation_token.check_token(user, token):
+        form = CustomSetPasswordForm(user)
+        if request.method == "POST":
+            form = CustomSetPasswordForm(user, request.POST)
+            if await sync_to_async(form.is_valid)():
+                await run_hashing(user.set_password, form.cleaned_data["new_password1"])
+                await sync_to_async(run_write)(user.save, update_fields=["password"])
+                messages.success(request, "Your password has been set. You may go ahead and <b>log in </b> now.")
+                return redirect("/")
+
+        return await arender(request, "password_reset_confirm.html", {"form": form})
+    else:
+        messages.error(request, "Link is expired")
+
+    return redirect("/")
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+
+from .password_upgrades import schedule_password_upgrade
+from .throttling import login_throttle
 
 UserModel = get_user_model()
 
@@ -12,13 +16,41 @@ class CustomBackend(ModelBackend):
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = UserModel.objects.get(Q(email__iexact=username) | Q(username__iexact=username))
-        except UserModel.DoesNotExist:
+        user = self.get_verified_user(request, username, password)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+
+    def get_verified_user(self, request, username, password):
+        """
+        Return the user matching the identifier if the password is correct,
+        whether or not the account is allowed to log in.
+        This costs one query and one password hash, and raises
+        LoginThrottled without either when the attempt is throttled.
+        """
+        if username is None or password is None:
+            return
+        # Raises LoginThrottled before any query or hashing when over the limit.
+        login_throttle.check(request, username)
+        user = UserModel.objects.filter_by_identifier(username).order_by("id").first()
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
             UserModel().set_password(password)
+            login_throttle.record_failure(request, username)
             return
-        except UserModel.MultipleObjectsReturned:
-            user = UserModel.objects.get(Q(email__iexact=username) | Q(username__iexact=username)).order_by("id").first()
 
-        if user.check_password(password) and self.user_can_authenticate(user):
+        if self.check_user_password(user, password):
             return user
+        login_throttle.record_failure(request, username)
+
+    def check_user_password(self, user, password):
+        """
+        Check the password like user.check_password(). With
+        ACCOUNTS_DEFER_PASSWORD_UPGRADES, a hash that needs upgrading is
+        rehashed in the background, keeping the login free of writes.
+        """
+        if not getattr(settings, "ACCOUNTS_DEFER_PASSWORD_UPGRADES", False):
+            return user.check_password(password)
+        return check_password(
+            password, user.password, setter=lambda raw_password: schedule_password_upgrade(user, raw_password)
+        )
@@ -0,0 +1,225 @@
+import itertools
+import platform
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import django
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .forms import UserLoginForm
+from .models import User
+from .outbox import queue_email
+from .sqlite import run_write
+from .token import account_activation_token
+from .validators import UsernameValidator, AgeValidator
+
+
+BENCHMARK_PASSWORD = "benchmark-Password-1"
+
+# Default number of timed calls per benchmark. Password hashing dominates the
+# authentication benchmarks, so they run far fewer iterations.
+HASHING_ITERATIONS = 10
+FAST_ITERATIONS = 2000
+
+# Results benchmark_accounts compares against unless told otherwise, the
+# slowest median of several runs.
+BASELINE_PATH = Path(__file__).with_name("benchmark_baseline.json")
+
+# The medians of microsecond benchmarks jitter by a few microseconds between
+# runs, so smaller slowdowns never count as regressions.
+MIN_REGRESSION_US = 5
+
+# Timings are only comparable between runs on the same kind of machine,
+# database and password hasher, against a dataset of the same size.
+BASELINE_META_KEYS = ["dataset_size", "database", "hasher", "machine"]
+
+
+
+def create_dataset(size, inactive_every=10):
+    """
+    Bulk insert size synthetic users sharing one password hash, every
+    inactive_every-th of them inactive. Returns (active, inactive) samples.
+    """
+    password = make_password(BENCHMARK_PASSWORD)
+    now = timezone.now()
+    users = []
+    for i in range(size):
+        is_active = bool(i % inactive_every)
+        user = User(
+            email=f"bench{i}@example.com",
+            username=f"bench{i}",
+            password=password,
+            is_active=is_active,
+            activated_at=now if is_active else None,
+        )
+        user.populate_lookup_keys()
+        users.append(user)
+    User.objects.bulk_create(users, batch_size=1000)
+    active = User.objects.filter(is_active=True).order_by("-pk").first()
+    inactive = User.objects.filter(is_active=False).order_by("-pk").first()
+    return active, inactive
+
+
+def measure(func, iterations):
+    """Call func iterations times and return timing and query statistics."""
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "min_us": round(timings[0], 2),
+        "median_us": round(statistics.median(timings), 2),
+        "mean_us": round(statistics.fmean(timings), 2),
+        "p95_us": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "queries_per_op": round(len(queries.captured_queries) / iterations, 3),
+    }
+
+
+def get_benchmarks(active, inactive):
+    """Return (name, callable, default iterations) for every benchmark."""
+    counter = itertools.count()
+    token = account_activation_token.make_token(active)
+    username_validator = UsernameValidator()
+    age_validator = AgeValidator()
+
+    def login_form_clean():
+        form = UserLoginForm(data={"username": active.email, "password": BENCHMARK_PASSWORD})
+        assert form.is_valid()
+
+    def user_save():
+        User(email=f"saved{next(counter)}@example.com", password="!").save()
+
+    return [
+        ("authenticate_hit", lambda: authenticate(username=active.email, password=BENCHMARK_PASSWORD), HASHING_ITERATIONS),
+        ("authenticate_miss", lambda: authenticate(username="nobody@example.com", password=BENCHMARK_PASSWORD), HASHING_ITERATIONS),
+        ("authenticate_inactive", lambda: authenticate(username=inactive.username, password=BENCHMARK_PASSWORD), HASHING_ITERATIONS),
+        ("login_form_clean", login_form_clean, HASHING_ITERATIONS),
+        ("user_save", user_save, FAST_ITERATIONS // 10),
+        ("token_make", lambda: account_activation_token.make_token(active), FAST_ITERATIONS),
+        ("token_check", lambda: account_activation_token.check_token(active, token), FAST_ITERATIONS),
+        ("username_validator", lambda: username_validator("bench_user1"), FAST_ITERATIONS),
+        ("age_validator", lambda: age_validator(date(1990, 5, 17)), FAST_ITERATIONS),
+    ]
+
+
+def run_benchmarks(dataset_size, scale=1.0, only=None):
+    """
+    Create the synthetic dataset in the current database and run the
+    benchmarks. Returns a JSON-serializable result dict.
+    """
+    active, inactive = create_dataset(dataset_size)
+    results = {}
+    for name, func, iterations in get_benchmarks(active, inactive):
+        if only and name not in only:
+            continue
+        func()  # warm up caches and lazy imports
+        results[name] = measure(func, max(1, int(iterations * scale)))
+
+    return {
+        "meta": {
+            "dataset_size": dataset_size,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "hasher": get_hasher().algorithm,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def baseline_mismatches(results, baseline):
+    """
+    Return a description of every BASELINE_META_KEYS entry that differs
+    between the results and the baseline.
+    """
+    meta, baseline_meta = results["meta"], baseline.get("meta", {})
+    return [
+        f"{key} {meta.get(key)!r} (baseline {baseline_meta.get(key)!r})"
+        for key in BASELINE_META_KEYS
+        if meta.get(key) != baseline_meta.get(key)
+    ]
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return a list of regression messages: benchmarks whose median time grew
+    by more than tolerance, or that run more queries per call than the
+    baseline.
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        expected = baseline.get("results", {}).get(name)
+        if expected is None:
+            continue
+        limit = max(expected["median_us"] * (1 + tolerance), expected["median_us"] + MIN_REGRESSION_US)
+        if result["median_us"] > limit:
+            regressions.append(
+                f"{name}: median {result['median_us']:.1f}us, baseline "
+                f"{expected['median_us']:.1f}us (+{tolerance:.0%} allowed)"
+            )
+        # Pooled work such as username allocation makes the average query
+        # count drift slightly with the number of iterations.
+        if result["queries_per_op"] > expected["queries_per_op"] * 1.05:
+            regressions.append(
+                f"{name}: {result['queries_per_op']} queries per call, "
+                f"baseline {expected['queries_per_op']}"
+            )
+    return regressions
+
+
+def run_signup_workload(signups, threads):
+    """
+    Create signups accounts from threads concurrent threads the way
+    registration does (user, profile and queued email) through run_write,
+    each followed by a login lookup. Returns throughput and error counts.
+    """
+    counter = itertools.count()
+    lock = threading.Lock()
+    errors = {"locked": 0, "other": 0}
+
+    def signup():
+        number = next(counter)
+        user = User(email=f"signup{number}-{time.time_ns()}@example.com", password="!")
+        user.save()
+        queue_email("Activate your account", "benchmark", user.email)
+        return user.email
+
+    def worker(count):
+        try:
+            for _ in range(count):
+                try:
+                    email = run_write(signup)
+                    User.objects.filter_by_identifier(email).first()
+                except OperationalError as error:
+                    with lock:
+                        errors["locked" if "locked" in str(error) else "other"] += 1
+        finally:
+            connections.close_all()
+
+    per_thread = [signups // threads + (i < signups % threads) for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, per_thread))
+    duration = time.perf_counter() - started
+    completed = signups - errors["locked"] - errors["other"]
+    return {
+        "signups": signups,
+        "threads": threads,
+        "duration_s": round(duration, 3),
+        "signups_per_s": round(completed / duration, 1),
+        "locked_errors": errors["locked"],
+        "other_errors": errors["other"],
+    }
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Coalesce, Now
+
+from .emails import render_confirmation_email, render_password_reset_email
+from .models import User
+from .outbox import queue_emails
+from .user_cache import invalidate_cached_users
+
+
+
+def get_chunk_size():
+    return getattr(settings, "ACCOUNTS_BULK_CHUNK_SIZE", 1000)
+
+
+def iter_pk_chunks(queryset, chunk_size=None):
+    """
+    Yield the primary keys of queryset in ascending lists of at most
+    chunk_size, reading each chunk with an index range scan after the last
+    key of the previous one.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    queryset = queryset.order_by("pk").values_list("pk", flat=True)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def bulk_set_active(queryset, is_active, chunk_size=None):
+    """
+    Activate or deactivate the users of queryset with one UPDATE per chunk,
+    without calling User.save. Returns the number of users changed.
+    Deactivated users are logged out on their next request, since the
+    backend no longer returns them for their session.
+    """
+    changes = {"is_active": is_active}
+    if is_active:
+        changes["activated_at"] = Coalesce("activated_at", Now())
+    changed = 0
+    for pks in iter_pk_chunks(queryset.exclude(is_active=is_active), chunk_size):
+        with transaction.atomic():
+            changed += User.objects.filter(pk__in=pks).exclude(is_active=is_active).update(**changes)
+        invalidate_cached_users(pks)
+    return changed
+
+
+def bulk_force_password_reset(queryset, domain, chunk_size=None):
+    """
+    Give the users of queryset an unusable password, which also ends their
+    sessions, and queue a password reset email to each of them.
+    Returns the number of users reset.
+    """
+    reset = 0
+    for pks in iter_pk_chunks(queryset, chunk_size):
+        users = list(User.objects.filter(pk__in=pks).only("pk", "email", "username", "is_active"))
+        with transaction.atomic():
+            # Unusable passwords can't be checked, so one value serves the chunk.
+            User.objects.filter(pk__in=pks).update(password=make_password(None))
+            queue_emails(
+                render_password_reset_email(user, domain) + (user.email,) for user in users
+            )
+        invalidate_cached_users(pks)
+        reset += len(users)
+    return reset
+
+
+def bulk_resend_confirmation(queryset, domain, chunk_size=None):
+    """
+    Queue a new confirmation email to every user of queryset that hasn't
+    activated the account yet. Returns the number of emails queued.
+    """
+    queued = 0
+    for pks in iter_pk_chunks(queryset.filter(is_active=False), chunk_size):
+        users = User.objects.filter(pk__in=pks).only("pk", "email", "username", "is_active")
+        queued += len(queue_emails(
+            render_confirmation_email(user, domain) + (user.email,) for user in users
+        ))
+    return queued
@@ -0,0 +1,102 @@
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+# Query string parameter holding the primary key the next page starts after.
+KEYSET_VAR = "after"
+
+# Filtered and searched changelists count at most this many rows.
+COUNT_LIMIT = 10000
+
+
+
+def estimate_row_count(model, using):
+    """
+    Return an estimate of the number of rows in the model's table without
+    scanning it: the planner statistics on PostgreSQL and MySQL, and the
+    highest primary key, read from the index, elsewhere.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+            row = cursor.fetchone()
+            if row and row[0] is not None:
+                return row[0]
+    return model._default_manager.using(using).aggregate(max_pk=Max("pk"))["max_pk"] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that never runs an unbounded COUNT(*): unfiltered lists use
+    the table estimate and filtered lists are counted up to COUNT_LIMIT.
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimate_row_count(queryset.model, queryset.db)
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+class KeysetChangeList(ChangeList):
+    """
+    A changelist that pages by primary key instead of OFFSET. Results are
+    always ordered by descending primary key and the next page starts
+    after the last key shown (?after=<pk>), so a deep page costs the same
+    index range scan as the first one.
+    """
+    keyset = True
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(KEYSET_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        return ["-pk"]
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        # Like the page number, the key isn't carried over into filter,
+        # search and sorting links.
+        self.keyset_after = self.params.pop(KEYSET_VAR, None)
+        if self.keyset_after:
+            try:
+                queryset = queryset.filter(pk__lt=int(self.keyset_after))
+            except ValueError:
+                raise IncorrectLookupParameters
+
+        result_list = list(queryset[:self.list_per_page + 1])
+        self.has_next_page = len(result_list) > self.list_per_page
+        result_list = result_list[:self.list_per_page]
+        self.next_page_url = (
+            self.get_query_string({KEYSET_VAR: result_list[-1].pk})
+            if self.has_next_page else None
+        )
+        self.first_page_url = self.get_query_string()
+
+        self.result_count = paginator.count
+        self.result_count_is_estimate = not self.queryset.query.where or self.result_count >= COUNT_LIMIT
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = paginator
@@ -1,4 +1,7 @@
+import asyncio
 from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import redirect
 
 
@@ -6,9 +9,20 @@ def user_not_authenticated(function=None, redirect_url="/"):
     """
     This decorator checks if the user is authenticated before calling the decorated function.
     If the user is authenticated, the decorator will redirect the user to the redirect_url.
+    Works with both sync and async views.
     """
     def decorator(view_func):
         
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                # request.user loads the session and the user from the database.
+                if await sync_to_async(lambda: request.user.is_authenticated)():
+                    return redirect(redirect_url)
+                return await view_func(request, *args, **kwargs)
+            
+            return _wrapped_async_view
+        
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
             if request.user.is_authenticated:
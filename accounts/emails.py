@@ -0,0 +1,27 @@
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .token import account_activation_token
+
+
+
+def render_confirmation_email(user, domain):
+    """Return the (subject, body) of the email confirming a new account."""
+    return "Activate your account", render_to_string("activate_email.html", {
+        "user": user,
+        "domain": domain,
+        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+        "token": account_activation_token.make_token(user),
+        # "protocol": "https" if request.is_secure else "http",
+    })
+
+
+def render_password_reset_email(user, domain):
+    """Return the (subject, body) of the password reset email."""
+    return "Password reset request", render_to_string("template_reset_password.html", {
+        "user": user,
+        "domain": domain,
+        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+        "token": account_activation_token.make_token(user),
+    })
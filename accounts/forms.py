@@ -8,13 +8,38 @@ from django.contrib.auth.forms import(
 ) 
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+
+from .backends import CustomBackend
+from .throttling import LoginThrottled
 
 UserModel = get_user_model()
 
 
 
-class CustomUserCreationForm(UserCreationForm):
+class CaseInsensitiveUniqueMixin:
+    """
+    Reject emails and usernames that only differ in case from those of
+    another user, which the unique email_lower and username_lower columns
+    would refuse.
+    """
+    def clean_email(self):
+        email = self.cleaned_data.get("email")
+        if email and UserModel.objects.filter(email_lower=email.lower()).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError(
+                _("A user with that email already exists."), code="unique"
+            )
+        return email
+
+    def clean_username(self):
+        username = self.cleaned_data.get("username")
+        if username and UserModel.objects.filter(username_lower=username.lower()).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError(
+                _("A user with that username already exists."), code="unique"
+            )
+        return username
+
+
+class CustomUserCreationForm(CaseInsensitiveUniqueMixin, UserCreationForm):
     """
     A form that creates a user, with no privileges, from the given email and
     password.
@@ -24,7 +49,7 @@ class CustomUserCreationForm(UserCreationForm):
         fields = ["email"]
 
 
-class CustomUserChangeForm(UserChangeForm):
+class CustomUserChangeForm(CaseInsensitiveUniqueMixin, UserChangeForm):
     """
     A form that allows users to change their password.
     """
@@ -47,23 +72,36 @@ class UserLoginForm(AuthenticationForm):
         widget=forms.PasswordInput(attrs={"autocomplete": "current-password", "placeholder": _("Password")})
     )
     
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        "throttled": _(
+            "Too many failed login attempts. Please try again in a few minutes."
+        ),
+    }
+    
     def __init__(self, request=None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        super().__init__(request, *args, **kwargs)
         
     def clean(self):
+        """
+        Verify the credentials through CustomBackend and keep the verified
+        user, so the view can log in without authenticating a second time.
+        """
         username = self.cleaned_data.get("username")
         password = self.cleaned_data.get("password")
         
         if username and password:
+            backend = CustomBackend()
             try:
-                self.user_cache = UserModel.objects.get(Q(email=username) | Q(username=username))
-                if self.user_cache.check_password(password):
-                    self.confirm_login_allowed(self.user_cache)
-                    
-                else:
-                    raise self.get_invalid_login_error()
-            except UserModel.DoesNotExist:
-                raise self.get_invalid_login_error()     
+                self.user_cache = backend.get_verified_user(self.request, username, password)
+            except LoginThrottled:
+                raise forms.ValidationError(
+                    self.error_messages["throttled"], code="throttled"
+                )
+            if self.user_cache is None:
+                raise self.get_invalid_login_error()
+            self.confirm_login_allowed(self.user_cache)
+            self.user_cache.backend = f"{backend.__module__}.{backend.__class__.__name__}"
         
         return self.cleaned_data
 
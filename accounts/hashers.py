@@ -0,0 +1,71 @@
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from .metrics import track
+
+
+# Set while a hash is being timed; PBKDF2's verify() calls encode() again.
+hashing = ContextVar("accounts_hashing", default=False)
+
+
+
+def get_cost(name, default):
+    """Return a work factor setting, or Django's default when it is None."""
+    value = getattr(settings, name, None)
+    return default if value is None else value
+
+
+def track_hashing():
+    return nullcontext() if hashing.get() else track("password_hash")
+
+
+class TimedHasherMixin:
+    """Counts the time spent hashing and verifying passwords in the request metrics."""
+    def encode(self, password, salt, *args, **kwargs):
+        with track_hashing():
+            token = hashing.set(True)
+            try:
+                return super().encode(password, salt, *args, **kwargs)
+            finally:
+                hashing.reset(token)
+
+    def verify(self, password, encoded):
+        with track_hashing():
+            token = hashing.set(True)
+            try:
+                return super().verify(password, encoded)
+            finally:
+                hashing.reset(token)
+
+
+# The work factors can be set in settings, see `manage.py calibrate_hashers`.
+
+class PBKDF2PasswordHasher(TimedHasherMixin, hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return get_cost("PASSWORD_PBKDF2_ITERATIONS", hashers.PBKDF2PasswordHasher.iterations)
+
+
+class PBKDF2SHA1PasswordHasher(TimedHasherMixin, hashers.PBKDF2SHA1PasswordHasher):
+    @property
+    def iterations(self):
+        return get_cost("PASSWORD_PBKDF2_ITERATIONS", hashers.PBKDF2SHA1PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(TimedHasherMixin, hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return get_cost("PASSWORD_ARGON2_TIME_COST", hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return get_cost("PASSWORD_ARGON2_MEMORY_COST", hashers.Argon2PasswordHasher.memory_cost)
+
+
+class BCryptSHA256PasswordHasher(TimedHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return get_cost("PASSWORD_BCRYPT_ROUNDS", hashers.BCryptSHA256PasswordHasher.rounds)
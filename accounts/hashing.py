@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+# Password hashing releases the GIL, so a small pool of threads keeps the
+# event loop free while bounding how many hashes run at once.
+hashing_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PASSWORD_HASHING_THREADS", None) or os.cpu_count(),
+    thread_name_prefix="password-hashing",
+)
+
+
+
+def run_with_connection_cleanup(func, *args, **kwargs):
+    """
+    Call func in a pool thread, closing the thread's database connection
+    afterwards the same way Django does at the end of a request.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_hashing(func, *args, **kwargs):
+    """
+    Run func, which hashes or checks a password, in the hashing pool and
+    wait for the result without blocking the event loop.
+    The caller's context is copied, so the time is counted in the request's
+    metrics.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        hashing_executor, partial(context.run, run_with_connection_cleanup, func, *args, **kwargs)
+    )
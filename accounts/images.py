@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+# Pillow releases the GIL while resizing and encoding, so a few threads
+# are enough to keep rendition work off the request path.
+rendition_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PROFILE_IMAGE_WORKERS", 2),
+    thread_name_prefix="profile-image",
+)
+
+
+
+def get_renditions():
+    return getattr(settings, "PROFILE_IMAGE_RENDITIONS", {"small": 64, "medium": 256})
+
+
+def clean_profile_image(upload):
+    """
+    Re-encode an uploaded profile image without its metadata (EXIF, GPS,
+    ICC comments) and downscaled to PROFILE_IMAGE_MAX_SIZE.
+    The returned file is named after a hash of its content, so renditions
+    derived from the name never go stale.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image = ImageOps.exif_transpose(image)
+        max_size = getattr(settings, "PROFILE_IMAGE_MAX_SIZE", 1024)
+        image.thumbnail((max_size, max_size))
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            fmt, extension = "PNG", "png"
+        else:
+            image = image.convert("RGB")
+            fmt, extension = "JPEG", "jpg"
+        output = BytesIO()
+        # A fresh encode only writes pixel data, the metadata is dropped.
+        image.save(output, fmt, optimize=True)
+
+    data = output.getvalue()
+    digest = hashlib.sha1(data).hexdigest()[:20]
+    return ContentFile(data, name=f"{digest}.{extension}")
+
+
+def rendition_name(source_name, size_name, fmt):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "renditions", stem, f"{size_name}.{fmt}")
+
+
+def rendition_cache_key(name):
+    return f"profile-image-rendition:{hashlib.sha1(name.encode()).hexdigest()}"
+
+
+def generate_renditions(source_name, storage=default_storage):
+    """
+    Create the missing square renditions of a stored profile image in every
+    configured size and format. Existing renditions are left alone.
+    """
+    renditions = get_renditions()
+    missing = [
+        (size_name, size, fmt)
+        for size_name, size in renditions.items()
+        for fmt in RENDITION_FORMATS
+        if not storage.exists(rendition_name(source_name, size_name, fmt))
+    ]
+    if not missing:
+        return 0
+
+    with storage.open(source_name, "rb") as source, Image.open(source) as image:
+        image = image.convert("RGB")
+    for size_name, size, fmt in missing:
+        pil_format, options = RENDITION_FORMATS[fmt]
+        rendition = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        output = BytesIO()
+        rendition.save(output, pil_format, **options)
+        name = rendition_name(source_name, size_name, fmt)
+        saved_name = storage.save(name, ContentFile(output.getvalue()))
+        cache.set(rendition_cache_key(name), storage.url(saved_name), None)
+    return len(missing)
+
+
+def schedule_renditions(source_name):
+    """Generate the renditions of a profile image in the background."""
+    def run():
+        try:
+            generate_renditions(source_name)
+        except Exception:
+            logger.exception("Generating renditions of %s failed", source_name)
+
+    return rendition_executor.submit(run)
+
+
+def rendition_url(image, size_name="small", fmt="webp", storage=default_storage):
+    """
+    Return the URL of a rendition of a profile image field, falling back
+    to the original image while the rendition doesn't exist yet.
+    Rendition URLs are cached, so a hit costs one cache lookup.
+    """
+    if not image:
+        return ""
+    name = rendition_name(image.name, size_name, fmt)
+    key = rendition_cache_key(name)
+    url = cache.get(key)
+    if url is None:
+        if not storage.exists(name):
+            return image.url
+        url = storage.url(name)
+        cache.set(key, url, None)
+    return url
@@ -0,0 +1,96 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.utils import timezone
+
+from .hashing import run_with_connection_cleanup
+from .models import User
+from .sqlite import run_write
+
+
+logger = logging.getLogger(__name__)
+
+
+
+def get_flush_interval():
+    return getattr(settings, "LAST_LOGIN_FLUSH_INTERVAL", 30)
+
+
+class LastLoginBuffer:
+    """
+    Login timestamps waiting to be written, keyed by user id. A background
+    thread writes them with one bulk UPDATE per batch every
+    LAST_LOGIN_FLUSH_INTERVAL seconds, or as soon as
+    LAST_LOGIN_FLUSH_THRESHOLD users are waiting, and whatever is left is
+    written when the process exits.
+
+    A process killed without running its exit handlers (SIGKILL, the OOM
+    killer, a crash) loses the timestamps of the logins since the last
+    flush, at most one interval or threshold worth.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.due = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def add(self, user_id, timestamp):
+        with self.lock:
+            self.pending[user_id] = max(timestamp, self.pending.get(user_id, timestamp))
+            if len(self.pending) >= getattr(settings, "LAST_LOGIN_FLUSH_THRESHOLD", 1000):
+                self.due.set()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="last-login-flush", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.due.wait(get_flush_interval())
+            self.due.clear()
+            if self.stopped.is_set():
+                return
+            run_with_connection_cleanup(self.flush)
+
+    def flush(self, write=run_write):
+        """Write the buffered timestamps and return how many users were updated."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        users = [User(pk=user_id, last_login=timestamp) for user_id, timestamp in pending.items()]
+        try:
+            write(User.objects.bulk_update, users, ["last_login"], batch_size=500)
+        except Exception:
+            logger.exception("Writing %d last_login timestamps failed, retrying later", len(pending))
+            with self.lock:
+                for user_id, timestamp in pending.items():
+                    self.pending[user_id] = max(timestamp, self.pending.get(user_id, timestamp))
+            return 0
+        return len(users)
+
+    def shutdown(self):
+        # No new threads can be started at exit, so skip the write queue.
+        self.stopped.set()
+        self.due.set()
+        run_with_connection_cleanup(self.flush, write=lambda func, *args, **kwargs: func(*args, **kwargs))
+
+
+last_login_buffer = LastLoginBuffer()
+atexit.register(last_login_buffer.shutdown)
+
+
+def record_last_login(sender, user, **kwargs):
+    """
+    user_logged_in receiver replacing django.contrib.auth's
+    update_last_login. With ACCOUNTS_COALESCE_LAST_LOGIN, the new timestamp
+    is set on the user right away and written to the database with the
+    next flush instead of by an UPDATE per login.
+    """
+    if not getattr(settings, "ACCOUNTS_COALESCE_LAST_LOGIN", False):
+        return update_last_login(sender, user, **kwargs)
+    user.last_login = timezone.now()
+    last_login_buffer.add(user.pk, user.last_login)
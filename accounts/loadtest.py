@@ -0,0 +1,189 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core import mail
+from django.db import connections
+from django.test import Client
+from django.urls import resolve
+
+from .outbox import send_queued_emails
+
+
+LOADTEST_PASSWORD = "LoadTest-Password-1"
+RESET_PASSWORD = "LoadTest-Password-2"
+
+ACTIVATION_LINK = re.compile(r"https?://[^/\s]+(/activate/\S+/)")
+RESET_LINK = re.compile(r"https?://[^/\s]+(/reset/\S+/)")
+
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadTestError(Exception):
+    pass
+
+
+class Recorder:
+    """Collects request latencies per method and URL name from all client threads."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, client, method, path, data=None, redirect_to=None):
+        """
+        Send a request and record its latency. Unless the response is a 200,
+        or a redirect to redirect_to when given, the step is counted as an
+        error and LoadTestError fails the flow.
+        """
+        name = f"{method.upper()} {resolve(path).url_name}"
+        started = time.perf_counter()
+        response = getattr(client, method)(path, data or {})
+        elapsed = time.perf_counter() - started
+        if redirect_to is None:
+            succeeded = response.status_code == 200
+        else:
+            succeeded = response.status_code == 302 and response["Location"] == redirect_to
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if not succeeded:
+                self.errors[name] += 1
+        if not succeeded:
+            raise LoadTestError(
+                f"{name} returned {response.status_code} {response.get('Location', '')}, "
+                f"expected {f'a redirect to {redirect_to}' if redirect_to else 200}"
+            )
+        return response
+
+    def summary(self, duration):
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            }
+        return endpoints
+
+
+class Mailbox:
+    """
+    Drains the email outbox into the locmem mailbox in the background, like
+    the send_queued_emails worker, and lets clients wait for their emails.
+    """
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                sent, failed = send_queued_emails()
+                if not (sent or failed):
+                    self.stopped.wait(self.interval)
+        finally:
+            connections.close_all()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def wait_for_link(self, to_email, pattern, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for message in reversed(list(mail.outbox)):
+                if to_email in message.to:
+                    match = pattern.search(message.body)
+                    if match:
+                        return match.group(1)
+            time.sleep(self.interval)
+        raise LoadTestError(f"No email matching {pattern.pattern} for {to_email}")
+
+
+def run_flow(number, recorder, mailbox):
+    """
+    Run one full account lifecycle: register, activate, log in, log out,
+    reset the password and log in and out again with the new password.
+    """
+    client = Client()
+    email = f"loadtest{number}-{time.time_ns()}@example.com"
+    try:
+        recorder.request(client, "get", "/register/")
+        recorder.request(client, "post", "/register/", {
+            "email": email, "password1": LOADTEST_PASSWORD, "password2": LOADTEST_PASSWORD,
+        }, redirect_to="/")
+        recorder.request(client, "get", mailbox.wait_for_link(email, ACTIVATION_LINK), redirect_to="/login/")
+
+        recorder.request(client, "post", "/login/", {
+            "username": email, "password": LOADTEST_PASSWORD,
+        }, redirect_to="/")
+        recorder.request(client, "get", "/")
+        recorder.request(client, "get", "/logout/", redirect_to="/")
+
+        recorder.request(client, "post", "/password_reset", {"email": email}, redirect_to="/")
+        reset_link = mailbox.wait_for_link(email, RESET_LINK)
+        recorder.request(client, "get", reset_link)
+        recorder.request(client, "post", reset_link, {
+            "new_password1": RESET_PASSWORD, "new_password2": RESET_PASSWORD,
+        }, redirect_to="/")
+
+        # Only the new password logs in if the reset was saved.
+        recorder.request(client, "post", "/login/", {
+            "username": email, "password": RESET_PASSWORD,
+        }, redirect_to="/")
+        recorder.request(client, "get", "/")
+        recorder.request(client, "get", "/logout/", redirect_to="/")
+    finally:
+        connections.close_all()
+
+
+def run_load_test(flows, clients):
+    """
+    Run flows account lifecycles with the given number of concurrent
+    clients against the project's URLconf and return the report.
+    The caller sets up the database and the locmem email backend.
+    """
+    recorder = Recorder()
+    mailbox = Mailbox()
+    mailbox.start()
+    failures = []
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(clients) as pool:
+            futures = [pool.submit(run_flow, number, recorder, mailbox) for number in range(flows)]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as error:
+                    failures.append(repr(error))
+    finally:
+        mailbox.stop()
+    duration = time.perf_counter() - started
+
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "flows": flows,
+        "clients": clients,
+        "duration_s": round(duration, 3),
+        "completed_flows": flows - len(failures),
+        "flows_per_s": round((flows - len(failures)) / duration, 2),
+        "requests_per_s": round(total_requests / duration, 2),
+        "failures": failures,
+        "endpoints": recorder.summary(duration),
+    }
@@ -0,0 +1,158 @@
+import atexit
+import logging
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from .metrics import track
+
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection is dropped and the message retried once
+# on a fresh one: the server closed an idle connection or the socket broke.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+
+class ConnectionPool:
+    """
+    Open email backend connections kept per process, so consecutive batches
+    reuse the SMTP session and TLS handshake. Each connection is used by one
+    thread at a time; idle ones are closed after EMAIL_POOL_MAX_IDLE seconds
+    since servers drop them anyway.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def acquire(self):
+        """Return (connection, reused), opening a new connection if none is idle."""
+        max_idle = getattr(settings, "EMAIL_POOL_MAX_IDLE", 60)
+        stale = []
+        connection = None
+        with self.lock:
+            while self.idle:
+                candidate, released_at = self.idle.pop()
+                if time.monotonic() - released_at < max_idle:
+                    connection = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            self.discard(candidate)
+        if connection is not None:
+            return connection, True
+
+        connection = get_connection()
+        connection.open()
+        return connection, False
+
+    def release(self, connection):
+        with self.lock:
+            if len(self.idle) < getattr(settings, "EMAIL_POOL_SIZE", 2):
+                self.idle.append((connection, time.monotonic()))
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+
+pool = ConnectionPool()
+atexit.register(pool.close_all)
+
+
+class BatchProgress:
+    """
+    The messages of a batch, remembering how far send_messages() got, so
+    that when it raises the failed message is known and the ones before
+    it are not sent twice.
+    """
+    def __init__(self, messages):
+        self.messages = messages
+        self.position = 0
+
+    def __len__(self):
+        return len(self.messages) - self.position
+
+    def __iter__(self):
+        while self.position < len(self.messages):
+            yield self.messages[self.position]
+            self.position += 1
+
+
+class BatchResult:
+    def __init__(self, size):
+        self.errors = [None] * size
+        self.reconnects = 0
+        self.duration = 0.0
+
+    @property
+    def sent(self):
+        return self.errors.count(None)
+
+    @property
+    def failed(self):
+        return len(self.errors) - self.sent
+
+
+def send_batch(messages, connection=None):
+    """
+    Send messages with send_messages() over a pooled connection.
+    A message that fails is skipped and the rest of the batch goes on over a
+    new connection; a message that fails because a reused connection went
+    stale is retried once first. Returns a BatchResult holding the error of
+    each message, or None for the ones sent.
+    """
+    result = BatchResult(len(messages))
+    progress = BatchProgress(messages)
+    pooled = connection is None
+    started = time.perf_counter()
+    retried = False
+    with track("email"):
+        while len(progress):
+            if pooled:
+                try:
+                    connection, reused = pool.acquire()
+                except Exception as error:
+                    # Nothing can be sent until the server is reachable again.
+                    for index in range(progress.position, len(messages)):
+                        result.errors[index] = error
+                    break
+            else:
+                reused = True
+            try:
+                connection.send_messages(progress)
+            except Exception as error:
+                if pooled:
+                    pool.discard(connection)
+                else:
+                    connection.close()
+                result.reconnects += 1
+                if isinstance(error, CONNECTION_ERRORS) and reused and not retried:
+                    retried = True
+                    continue
+                result.errors[progress.position] = error
+                progress.position += 1
+                retried = False
+            else:
+                if pooled:
+                    pool.release(connection)
+    result.duration = time.perf_counter() - started
+    logger.info(
+        "Sent %d of %d email(s) in %.3fs, %d reconnect(s)",
+        result.sent, len(messages), result.duration, result.reconnects,
+    )
+    return result
@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from accounts.benchmarks import BASELINE_PATH, baseline_mismatches, compare_to_baseline, run_benchmarks
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the accounts hot paths and count their queries against a "
+        "synthetic dataset in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=10000,
+            help="Number of synthetic users in the dataset.",
+        )
+        parser.add_argument(
+            "--scale", type=float, default=1.0,
+            help="Multiplier for the number of iterations of every benchmark.",
+        )
+        parser.add_argument(
+            "--only", nargs="+",
+            help="Only run the named benchmarks.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the results as JSON to this file.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Fail if the results regress against this JSON results file. "
+                 "Defaults to the baseline committed with the app, which is "
+                 "skipped when it was measured with a different dataset size, "
+                 "database, hasher or machine. Refresh it with --output after "
+                 "an intended change.",
+        )
+        parser.add_argument(
+            "--no-baseline", action="store_true",
+            help="Don't compare the results against a baseline.",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed relative slowdown of the median time against the baseline.",
+        )
+
+    def handle(self, *args, **options):
+        # The benchmarks measure the code paths, not the login throttle.
+        with override_settings(LOGIN_THROTTLE_ENABLED=False):
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+            try:
+                results = run_benchmarks(options["users"], options["scale"], options["only"])
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        for name, result in results["results"].items():
+            self.stdout.write(
+                f"{name:<24} median {result['median_us']:>12.1f}us  "
+                f"p95 {result['p95_us']:>12.1f}us  "
+                f"{result['queries_per_op']:>6} queries/op"
+            )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2) + "\n")
+
+        if not options["no_baseline"]:
+            baseline = json.loads(Path(options["baseline"] or BASELINE_PATH).read_text())
+            mismatches = baseline_mismatches(results, baseline)
+            if mismatches:
+                message = "The baseline was measured with a different " + ", ".join(mismatches)
+                if options["baseline"]:
+                    raise CommandError(message + ".")
+                self.stderr.write(self.style.WARNING(message + ", skipping the comparison."))
+                return
+            regressions = compare_to_baseline(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
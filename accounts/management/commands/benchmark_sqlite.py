@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from accounts.benchmarks import run_signup_workload
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent signup throughput on SQLite with the default "
+        "settings and with SQLITE_HIGH_CONCURRENCY, each in a fresh "
+        "throwaway database file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--signups", type=int, default=2000,
+            help="Number of accounts created per run.",
+        )
+        parser.add_argument(
+            "--threads", type=int, default=16,
+            help="Number of concurrent threads.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the results as JSON to this file.",
+        )
+
+    def run(self, high_concurrency, options):
+        test_db_dir = tempfile.mkdtemp()
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(test_db_dir, "benchmark.sqlite3")
+        with override_settings(SQLITE_HIGH_CONCURRENCY=high_concurrency):
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+            try:
+                return run_signup_workload(options["signups"], options["threads"])
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                # WAL mode leaves -wal and -shm files next to the database.
+                shutil.rmtree(test_db_dir, ignore_errors=True)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database isn't SQLite.")
+
+        results = {
+            "default": self.run(False, options),
+            "high_concurrency": self.run(True, options),
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<18}{result['signups_per_s']:>10} signups/s  {result['duration_s']:>8}s  "
+                f"{result['locked_errors']} locked, {result['other_errors']} other errors"
+            )
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2))
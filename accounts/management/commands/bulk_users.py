@@ -0,0 +1,90 @@
+import sys
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from accounts.bulk import (
+    bulk_force_password_reset,
+    bulk_resend_confirmation,
+    bulk_set_active,
+    get_chunk_size,
+)
+from accounts.models import User
+
+
+ACTIONS = ["activate", "deactivate", "force_password_reset", "resend_confirmation"]
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Activate, deactivate, force a password reset of or resend the confirmation "
+        "email to many users with chunked UPDATEs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=ACTIONS)
+        parser.add_argument(
+            "--ids", type=lambda value: [int(pk) for pk in value.split(",")],
+            help="Comma separated user ids.",
+        )
+        parser.add_argument(
+            "--file",
+            help="File with one email or username per line, - for stdin.",
+        )
+        parser.add_argument(
+            "--joined-before",
+            help="Select the users who joined before this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--domain", default=getattr(settings, "ACCOUNTS_EMAIL_DOMAIN", "localhost:8000"),
+            help="Domain used in the links of the queued emails.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=get_chunk_size(),
+            help="Number of users updated per query.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only print how many users are selected.",
+        )
+
+    def get_querysets(self, options):
+        """Yield the selected users, one queryset per chunk of the identifier file."""
+        queryset = User.objects.all()
+        if options["ids"]:
+            queryset = queryset.filter(pk__in=options["ids"])
+        if options["joined_before"]:
+            queryset = queryset.filter(date_joined__lt=options["joined_before"])
+        if not options["file"]:
+            yield queryset
+            return
+
+        lines = sys.stdin if options["file"] == "-" else open(options["file"], encoding="utf-8")
+        with lines:
+            identifiers = (line.strip().lower() for line in lines if line.strip())
+            while True:
+                chunk = list(islice(identifiers, options["chunk_size"]))
+                if not chunk:
+                    return
+                yield queryset.filter(Q(email_lower__in=chunk) | Q(username_lower__in=chunk))
+
+    def run_action(self, queryset, options):
+        action = options["action"]
+        if action in ("activate", "deactivate"):
+            return bulk_set_active(queryset, action == "activate", options["chunk_size"])
+        if action == "force_password_reset":
+            return bulk_force_password_reset(queryset, options["domain"], options["chunk_size"])
+        return bulk_resend_confirmation(queryset, options["domain"], options["chunk_size"])
+
+    def handle(self, *args, **options):
+        if not (options["ids"] or options["file"] or options["joined_before"]):
+            raise CommandError("Select users with --ids, --file or --joined-before.")
+
+        total = 0
+        for queryset in self.get_querysets(options):
+            total += queryset.count() if options["dry_run"] else self.run_action(queryset, options)
+        verb = "Selected" if options["dry_run"] else "Updated"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} user(s) with {options['action']}."))
@@ -0,0 +1,125 @@
+import math
+import os
+import statistics
+import time
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+
+
+CALIBRATION_PASSWORD = "calibration-Password-1"
+
+
+
+def time_encode(hasher, samples, **params):
+    """Return the median seconds hasher takes to encode a password."""
+    salt = hasher.salt()
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        if params:
+            hasher.encode(CALIBRATION_PASSWORD, salt, **params)
+        else:
+            hasher.encode(CALIBRATION_PASSWORD, salt)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def probe(base, **attributes):
+    """Return an instance of a Django hasher class with other work factors."""
+    return type(f"Probe{base.__name__}", (base,), attributes)()
+
+
+def calibrate_pbkdf2(hasher, target, samples):
+    current = hasher.iterations
+    measured = time_encode(hasher, samples, iterations=current)
+    recommended = max(10000, int(round(current * target / measured, -4)))
+    expected = time_encode(hasher, samples, iterations=recommended)
+    return f"iterations={current}", measured, f"PASSWORD_PBKDF2_ITERATIONS = {recommended}", expected
+
+
+def calibrate_argon2(hasher, target, samples):
+    current = hasher.time_cost
+    measured = time_encode(hasher, samples)
+    recommended = max(1, round(current * target / measured))
+    expected = time_encode(
+        probe(hashers.Argon2PasswordHasher, time_cost=recommended, memory_cost=hasher.memory_cost), samples
+    )
+    return (
+        f"time_cost={current}, memory_cost={hasher.memory_cost}", measured,
+        f"PASSWORD_ARGON2_TIME_COST = {recommended}", expected,
+    )
+
+
+def calibrate_bcrypt(hasher, target, samples):
+    current = hasher.rounds
+    measured = time_encode(hasher, samples)
+    # Every extra round doubles the cost.
+    recommended = min(31, max(4, current + round(math.log2(target / measured))))
+    expected = time_encode(probe(hashers.BCryptSHA256PasswordHasher, rounds=recommended), samples)
+    return f"rounds={current}", measured, f"PASSWORD_BCRYPT_ROUNDS = {recommended}", expected
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the configured password hashers on this host and recommend "
+        "work factors for a target hashing time per login."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-ms", type=float, default=250,
+            help="Target time in milliseconds to hash one password.",
+        )
+        parser.add_argument(
+            "--samples", type=int, default=5,
+            help="Number of timed hashes per measurement.",
+        )
+
+    def handle(self, *args, **options):
+        target = options["target_ms"] / 1000
+        cpus = os.cpu_count() or 1
+        self.stdout.write(
+            f"Target {options['target_ms']:.0f}ms per hash on {cpus} CPU(s)"
+        )
+        # The preferred hasher comes first. Legacy hashers sharing its work
+        # factor setting, such as PBKDF2SHA1, would only contradict it.
+        calibrated = {}
+        for hasher in hashers.get_hashers():
+            if isinstance(hasher, hashers.PBKDF2PasswordHasher):
+                calibrate = calibrate_pbkdf2
+            elif isinstance(hasher, hashers.Argon2PasswordHasher):
+                calibrate = calibrate_argon2
+            elif isinstance(hasher, hashers.BCryptSHA256PasswordHasher):
+                calibrate = calibrate_bcrypt
+            else:
+                calibrate = None
+
+            if calibrate in calibrated:
+                self.stdout.write(
+                    f"{hasher.algorithm:<16}skipped: shares its work factor with {calibrated[calibrate]}"
+                )
+                continue
+            if hasher.library:
+                try:
+                    hasher._load_library()
+                except ValueError as error:
+                    self.stdout.write(f"{hasher.algorithm:<16}skipped: {error}")
+                    continue
+
+            if calibrate is None:
+                measured = time_encode(hasher, options["samples"])
+                self.stdout.write(f"{hasher.algorithm:<16}{measured * 1000:>8.1f}ms, no tunable work factor")
+                continue
+            calibrated[calibrate] = hasher.algorithm
+            current, measured, recommended, expected = calibrate(hasher, target, options["samples"])
+            self.stdout.write(
+                f"{hasher.algorithm:<16}{current}: {measured * 1000:.1f}ms "
+                f"(~{cpus / measured:.0f} logins/s)\n"
+                f"{'':<16}recommended {recommended}: {expected * 1000:.1f}ms "
+                f"(~{cpus / expected:.0f} logins/s)"
+            )
+        self.stdout.write(
+            "Stored hashes using other work factors are upgraded on the next login, "
+            "or in the background with ACCOUNTS_DEFER_PASSWORD_UPGRADES."
+        )
@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from accounts.export import EXPORT_FORMATS, get_export_chunk_size, iter_export
+from accounts.models import User
+
+
+
+class Command(BaseCommand):
+    help = "Stream all users joined with their profiles to a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", default="-",
+            help="Output file, - for stdout.",
+        )
+        parser.add_argument(
+            "--format", choices=list(EXPORT_FORMATS), default="csv",
+            help="Output format.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=get_export_chunk_size(),
+            help="Number of rows read per query.",
+        )
+        parser.add_argument(
+            "--active-only", action="store_true",
+            help="Only export active users.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = User.objects.all()
+        if options["active_only"]:
+            queryset = queryset.filter(is_active=True)
+
+        to_stdout = options["output"] == "-"
+        output = sys.stdout if to_stdout else open(options["output"], "w", encoding="utf-8", newline="")
+        count = -1 if options["format"] == "csv" else 0    # minus the header line
+        try:
+            for line in iter_export(queryset, options["format"], options["chunk_size"]):
+                output.write(line)
+                count += 1
+        finally:
+            if not to_stdout:
+                output.close()
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(f"Exported {max(count, 0)} user(s) to {options['output']}."))
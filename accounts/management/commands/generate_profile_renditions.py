@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from accounts.images import generate_renditions
+from accounts.models import Profile
+
+
+
+class Command(BaseCommand):
+    help = "Generate the missing renditions of all profile images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Number of threads generating renditions.",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Profile.objects.exclude(profile_image="").exclude(profile_image__isnull=True)
+            .values_list("profile_image", flat=True)
+            .iterator(chunk_size=2000)
+        )
+        generated = 0
+        with ThreadPoolExecutor(options["workers"]) as pool:
+            for count in pool.map(generate_renditions, names):
+                generated += count
+        self.stdout.write(self.style.SUCCESS(f"Generated {generated} rendition(s)."))
@@ -0,0 +1,196 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import MinLengthValidator, validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User, Profile, allocate_usernames
+from accounts.validators import UsernameValidator
+
+
+PROFILE_FIELDS = ["first_name", "last_name"]
+
+username_validators = [UsernameValidator(), MinLengthValidator(5)]
+
+
+
+def read_rows(stream, fmt):
+    """Yield the rows of a CSV or JSONL stream as dicts."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV or JSONL file with the columns email, "
+        "password, and optionally username, first_name and last_name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - to read from stdin.")
+        parser.add_argument(
+            "--format", choices=["csv", "jsonl"],
+            help="Input format. Guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Number of rows validated, hashed and inserted together.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Number of processes used to hash passwords.",
+        )
+        parser.add_argument(
+            "--active", action="store_true",
+            help="Create the accounts as active instead of waiting for email confirmation.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"]
+        if fmt is None:
+            if path == "-":
+                raise CommandError("--format is required when reading from stdin.")
+            fmt = "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+
+        self.is_active = options["active"]
+        self.workers = options["workers"]
+        self.lazy_profile = getattr(settings, "ACCOUNTS_LAZY_PROFILE", False)
+        self.imported = self.skipped = 0
+        started = time.monotonic()
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            with ProcessPoolExecutor(self.workers, initializer=django.setup) as pool:
+                rows = enumerate(read_rows(stream, fmt), start=1)
+                while True:
+                    batch = list(islice(rows, options["batch_size"]))
+                    if not batch:
+                        break
+                    self.import_batch(batch, pool)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f"Imported {self.imported} user(s), skipped {self.skipped} "
+                        f"({self.imported / max(elapsed, 1e-9):.0f} rows/s)"
+                    )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {self.imported} user(s) imported, {self.skipped} skipped "
+            f"in {elapsed:.1f}s ({self.imported / max(elapsed, 1e-9):.0f} rows/s)."
+        ))
+
+    def skip(self, row_number, reason):
+        self.skipped += 1
+        self.stderr.write(f"Row {row_number}: {reason}")
+
+    def import_batch(self, batch, pool):
+        """Validate, hash and insert one batch of rows."""
+        valid = self.validate_batch(batch)
+        if not valid:
+            return
+
+        chunksize = max(1, len(valid) // (self.workers * 4))
+        hashes = pool.map(make_password, [row.get("password") or None for row in valid], chunksize=chunksize)
+
+        # bulk_create() skips User.save(), which stamps activated_at.
+        activated_at = timezone.now() if self.is_active else None
+        users = []
+        for row, password in zip(valid, hashes):
+            user = User(
+                email=row["email"],
+                username=row["username"],
+                password=password,
+                is_active=self.is_active,
+                activated_at=activated_at,
+            )
+            user.populate_lookup_keys()
+            users.append(user)
+
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=len(users))
+            # SQLite doesn't return primary keys from bulk inserts, so
+            # read them back through the email index.
+            pks = dict(
+                User.objects.filter(email_lower__in=[user.email_lower for user in users])
+                .values_list("email_lower", "pk")
+            )
+            profiles = []
+            for user, row in zip(users, valid):
+                profile_data = {field: row.get(field) or None for field in PROFILE_FIELDS}
+                if self.lazy_profile and not any(profile_data.values()):
+                    continue
+                profiles.append(Profile(user_id=pks[user.email_lower], **profile_data))
+            Profile.objects.bulk_create(profiles, batch_size=len(users))
+        self.imported += len(users)
+
+    def validate_batch(self, batch):
+        """
+        Return the rows of the batch that can be inserted, with normalized
+        email and username. Usernames are lowercased like User.clean() does
+        for the sign up and admin forms, so imported accounts look the same
+        as the others. Uniqueness is checked with one query per column for
+        the whole batch.
+        """
+        candidates = []
+        for row_number, row in batch:
+            email = User.objects.normalize_email((row.get("email") or "").strip())
+            username = (row.get("username") or "").strip().lower()
+            try:
+                validate_email(email)
+                if username:
+                    for validator in username_validators:
+                        validator(username)
+                    if len(username) > 15:
+                        raise ValidationError("Username is longer than 15 characters.")
+            except ValidationError as error:
+                self.skip(row_number, "; ".join(error.messages))
+                continue
+            candidates.append((row_number, dict(row, email=email, username=username)))
+
+        emails = {row["email"].lower() for _, row in candidates}
+        usernames = {row["username"] for _, row in candidates if row["username"]}
+        taken_emails = set(
+            User.objects.filter(email_lower__in=emails).values_list("email_lower", flat=True)
+        )
+        taken_usernames = set(
+            User.objects.filter(username_lower__in=usernames).values_list("username_lower", flat=True)
+        )
+
+        valid = []
+        for row_number, row in candidates:
+            email_key = row["email"].lower()
+            if email_key in taken_emails:
+                self.skip(row_number, f"email {row['email']} already exists.")
+                continue
+            if row["username"] in taken_usernames:
+                self.skip(row_number, f"username {row['username']} already exists.")
+                continue
+            taken_emails.add(email_key)
+            if row["username"]:
+                taken_usernames.add(row["username"])
+            valid.append(row)
+
+        missing = [row for row in valid if not row["username"]]
+        for row, username in zip(missing, allocate_usernames(len(missing), exclude=taken_usernames)):
+            row["username"] = username
+        return valid
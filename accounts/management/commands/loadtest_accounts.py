@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from accounts.loadtest import run_load_test
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive register, activate, login, password reset and logout flows "
+        "through the real URLconf with concurrent in-process clients, in a "
+        "throwaway test database, and report throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--flows", type=int, default=100,
+            help="Number of complete account lifecycles to run.",
+        )
+        parser.add_argument(
+            "--clients", type=int, default=8,
+            help="Number of concurrent simulated clients.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the report as JSON to this file.",
+        )
+
+    def handle(self, *args, **options):
+        test_db_dir = None
+        if connection.vendor == "sqlite":
+            # Threads need a file database; in-memory test databases lock
+            # the whole shared cache on every write.
+            test_db_dir = tempfile.mkdtemp()
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(test_db_dir, "loadtest.sqlite3")
+
+        mail.outbox = []
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            ALLOWED_HOSTS=["testserver"],
+        ):
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+            try:
+                report = run_load_test(options["flows"], options["clients"])
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                if test_db_dir:
+                    # WAL mode leaves -wal and -shm files next to the database.
+                    shutil.rmtree(test_db_dir, ignore_errors=True)
+
+        self.stdout.write(
+            f"{report['completed_flows']}/{report['flows']} flows with {report['clients']} clients "
+            f"in {report['duration_s']}s: {report['flows_per_s']} flows/s, "
+            f"{report['requests_per_s']} requests/s"
+        )
+        self.stdout.write(f"{'endpoint':<32}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stats in report["endpoints"].items():
+            self.stdout.write(
+                f"{name:<32}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>10}"
+                f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+            )
+        for failure in report["failures"][:10]:
+            self.stderr.write(f"Flow failed: {failure}")
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.purge import get_purge_age, purge_unactivated_users, unactivated_users
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the accounts that were never activated, with their profiles, in small batches. "
+        "Accounts deactivated before activations were recorded (migration 0008) that never "
+        "logged in are taken for unactivated ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--age", type=int,
+            help="Seconds after signup an account is purged, defaults to "
+                 "ACCOUNTS_PURGE_UNACTIVATED_AFTER or PASSWORD_RESET_TIMEOUT.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int,
+            help="Number of users deleted per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only print how many accounts would be deleted.",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep purging periodically instead of exiting.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=3600,
+            help="Seconds to wait between purges in --loop mode.",
+        )
+
+    def report(self, total):
+        if self.verbosity >= 2:
+            self.stdout.write(f"Deleted {total} account(s) so far.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        age = options["age"] if options["age"] is not None else get_purge_age()
+        if options["dry_run"]:
+            count = unactivated_users(age).count()
+            self.stdout.write(f"{count} unactivated account(s) older than {age}s would be deleted.")
+            return
+
+        while True:
+            started = time.perf_counter()
+            try:
+                deleted = purge_unactivated_users(age, options["batch_size"], self.report)
+            except Exception as error:
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"Purge error: {error!r}")
+                deleted = 0
+            if deleted or not options["loop"]:
+                self.stdout.write(
+                    f"Deleted {deleted} unactivated account(s) in {time.perf_counter() - started:.1f}s."
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
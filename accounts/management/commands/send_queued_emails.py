@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import send_queued_emails
+
+
+
+class Command(BaseCommand):
+    help = "Send the account emails waiting in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int,
+            default=getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 100),
+            help="Number of emails claimed per batch.",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling the outbox instead of exiting once it is drained.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5,
+            help="Seconds to wait between polls in --loop mode.",
+        )
+
+    def report_batch(self, result):
+        if self.verbosity >= 2:
+            self.stdout.write(
+                f"Batch of {len(result.errors)}: {result.sent} sent, {result.failed} failed "
+                f"in {result.duration * 1000:.1f}ms, {result.reconnects} reconnect(s)."
+            )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        while True:
+            try:
+                sent, failed = send_queued_emails(batch_size=options["batch_size"], report=self.report_batch)
+            except Exception as error:
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"Outbox worker error: {error!r}")
+                sent = failed = 0
+
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed.")
+            if not options["loop"]:
+                break
+            if not (sent or failed):
+                time.sleep(options["interval"])
@@ -0,0 +1,44 @@
+import io
+import pstats
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.profiling import PROFILE_SUFFIX, get_profile_dir
+
+
+
+class Command(BaseCommand):
+    help = "Print the top functions across the request profiles captured by ProfilingMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir", type=Path,
+            help="Directory holding the profiles, defaults to PROFILING_DIR.",
+        )
+        parser.add_argument(
+            "--url-name",
+            help="Only include the profiles of this URL name.",
+        )
+        parser.add_argument(
+            "--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"],
+            help="Sort order of the functions.",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=30,
+            help="Number of functions to print.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["dir"] or get_profile_dir()
+        paths = sorted(directory.glob(f"*{PROFILE_SUFFIX}"))
+        if options["url_name"]:
+            paths = [path for path in paths if f"-{options['url_name']}-" in path.name]
+        if not paths:
+            raise CommandError(f"No profiles found in {directory}.")
+
+        output = io.StringIO()
+        stats = pstats.Stats(*(str(path) for path in paths), stream=output)
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+        self.stdout.write(f"{len(paths)} profile(s) from {directory}")
+        self.stdout.write(output.getvalue())
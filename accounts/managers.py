@@ -22,6 +22,18 @@ class CustomUserManager(BaseUserManager):
         user.save()
         return user
     
+    def filter_by_identifier(self, identifier):
+        """
+        Return the users whose email or username matches the identifier,
+        case-insensitively. Identifiers containing "@" are looked up by
+        email, everything else by username, so each lookup hits a single
+        index on the lowercased key columns.
+        """
+        key = identifier.lower()
+        if "@" in key:
+            return self.filter(email_lower=key)
+        return self.filter(username_lower=key)
+    
     def create_superuser(self, email, password, **extra_fields):
         """
         Create and save a superuser with the given email and password.
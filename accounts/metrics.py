@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.template.backends.django import DjangoTemplates, Template
+
+from .middleware import AsyncCapableMiddleware
+
+
+# Upper bounds in seconds, shared by all histograms.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Operations timed inside a request.
+OPERATIONS = ("sql", "password_hash", "template_render", "email")
+
+# Methods recorded as is; any other is recorded as "other", so clients
+# can't create unbounded series.
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+# Label used for work done outside of a request, e.g. by the outbox worker.
+NO_VIEW = "-"
+
+current_stats = ContextVar("accounts_request_stats", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters, keyed by metric name and label
+    values. Every request takes the lock once, when its stats are recorded.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+
+    def record_request(self, stats, method, status, duration):
+        method = method if method in METHODS else "other"
+        with self.lock:
+            self.histograms["accounts_request_duration_seconds", (stats.view, method, str(status))].observe(duration)
+            for operation in OPERATIONS:
+                count = stats.counts[operation]
+                if count:
+                    self.counters["accounts_operations_total", (stats.view, operation)] += count
+                    self.histograms["accounts_operation_duration_seconds", (stats.view, operation)].observe(
+                        stats.durations[operation]
+                    )
+
+    def record_operation(self, operation, duration):
+        with self.lock:
+            self.counters["accounts_operations_total", (NO_VIEW, operation)] += 1
+            self.histograms["accounts_operation_duration_seconds", (NO_VIEW, operation)].observe(duration)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        label_names = {
+            "accounts_request_duration_seconds": ("view", "method", "status"),
+            "accounts_operation_duration_seconds": ("view", "operation"),
+            "accounts_operations_total": ("view", "operation"),
+        }
+        help_texts = {
+            "accounts_request_duration_seconds": "Request latency per view.",
+            "accounts_operation_duration_seconds": "Time spent per request in SQL, password hashing, template rendering and email.",
+            "accounts_operations_total": "Number of SQL queries, password hashes, template renders and emails.",
+        }
+        with self.lock:
+            histograms = sorted(
+                (name, labels, list(h.counts), h.sum, h.count) for (name, labels), h in self.histograms.items()
+            )
+            counters = sorted((name, labels, value) for (name, labels), value in self.counters.items())
+
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        def format_labels(name, labels, extra=""):
+            pairs = [f'{key}="{escape_label(value)}"' for key, value in zip(label_names[name], labels)]
+            if extra:
+                pairs.append(extra)
+            return "{" + ",".join(pairs) + "}"
+
+        for name, labels, counts, total, count in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(name, labels, 'le="%s"' % bound)
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_labels(name, labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{bucket_labels} {count}")
+            lines.append(f"{name}_sum{format_labels(name, labels)} {total}")
+            lines.append(f"{name}_count{format_labels(name, labels)} {count}")
+        for name, labels, value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{format_labels(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    __slots__ = ("view", "counts", "durations")
+
+    def __init__(self):
+        self.view = NO_VIEW
+        self.counts = dict.fromkeys(OPERATIONS, 0)
+        self.durations = dict.fromkeys(OPERATIONS, 0.0)
+
+    def add(self, operation, duration):
+        self.counts[operation] += 1
+        self.durations[operation] += duration
+
+
+@contextmanager
+def track(operation):
+    """
+    Time a block as one operation of the current request, or record it on
+    its own when there is no request, e.g. in the outbox worker.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        stats = current_stats.get()
+        if stats is not None:
+            stats.add(operation, duration)
+        elif getattr(settings, "ACCOUNTS_METRICS_ENABLED", True):
+            registry.record_operation(operation, duration)
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    """Database execute wrapper timing queries run during a request."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add("sql", time.perf_counter() - started)
+
+
+def install_sql_instrumentation(sender, connection, **kwargs):
+    """connection_created receiver adding the SQL timing wrapper once per connection."""
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_execute_wrapper)
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Records the latency of every request, plus the number and duration of
+    SQL queries, password hashes, template renders and emails it caused,
+    labelled by URL name.
+    """
+    def handle(self, request):
+        if not getattr(settings, "ACCOUNTS_METRICS_ENABLED", True):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current_stats.reset(token)
+            self.record(request, stats, status, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "ACCOUNTS_METRICS_ENABLED", True):
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current_stats.reset(token)
+            self.record(request, stats, status, time.perf_counter() - started)
+
+    def record(self, request, stats, status, duration):
+        match = request.resolver_match
+        stats.view = (match.url_name or match.view_name) if match else NO_VIEW
+        registry.record_request(stats, request.method, status, duration)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        with track("template_render"):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every top-level render."""
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return InstrumentedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+def metrics_view(request):
+    """
+    Expose the metrics of this process to Prometheus, to the addresses in
+    ACCOUNTS_METRICS_ALLOWED_IPS and, when ACCOUNTS_METRICS_TOKEN is set,
+    only to requests sending it as a bearer token.
+    """
+    allowed = getattr(settings, "ACCOUNTS_METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    token = getattr(settings, "ACCOUNTS_METRICS_TOKEN", None)
+    if token and not constant_time_compare(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
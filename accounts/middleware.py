@@ -0,0 +1,46 @@
+import asyncio
+
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from .user_cache import get_cached_user
+
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Drop-in replacement for AuthenticationMiddleware that loads request.user
+    from the user cache instead of querying the database on every request.
+    """
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+class AsyncCapableMiddleware:
+    """
+    Base class for middleware that runs natively in both sync and async
+    chains. Subclasses implement handle() for sync chains and __acall__()
+    for async ones.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Like Django's MiddlewareMixin: mark the instance as a coroutine
+            # function so the handler awaits it instead of running the whole
+            # chain in the thread-sensitive sync thread.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError("subclasses of AsyncCapableMiddleware must provide a handle() method")
+
+    async def __acall__(self, request):
+        raise NotImplementedError("subclasses of AsyncCapableMiddleware must provide an __acall__() method")
@@ -0,0 +1,63 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:45
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_lookup_keys(apps, schema_editor):
+    """
+    Fill the lowercased lookup keys in primary key ranges, so each UPDATE
+    only touches a bounded number of rows and commits on its own.
+    """
+    User = apps.get_model("accounts", "User")
+    users = User.objects.using(schema_editor.connection.alias)
+    last_pk = users.order_by("-pk").values_list("pk", flat=True).first()
+    if last_pk is None:
+        return
+
+    start = 0
+    while start < last_pk:
+        end = start + BACKFILL_CHUNK_SIZE
+        users.filter(pk__gt=start, pk__lte=end).update(
+            email_lower=Lower("email"),
+            username_lower=Lower("username"),
+        )
+        start = end
+
+
+class Migration(migrations.Migration):
+    # Let every backfill chunk commit separately instead of holding one
+    # long write transaction over the whole user table.
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0002_auto_20230624_1745'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_lower',
+            field=models.CharField(default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='username_lower',
+            field=models.CharField(default='', editable=False, max_length=15),
+        ),
+        migrations.RunPython(backfill_lookup_keys, migrations.RunPython.noop),
+        # Build the indexes once the columns are filled.
+        migrations.AlterField(
+            model_name='user',
+            name='email_lower',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='username_lower',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=15),
+        ),
+    ]
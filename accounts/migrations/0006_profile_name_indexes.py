@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:55
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_profile_user_field'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='profile_first_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='profile_last_name_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_profile_name_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', False), ('last_login__isnull', True)), fields=['date_joined'], name='user_unactivated_joined_idx'),
+        ),
+    ]
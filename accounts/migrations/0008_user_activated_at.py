@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:22
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.db.models.functions import Now
+
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_activated_at(apps, schema_editor):
+    """
+    Mark the accounts known to have been activated: the active ones and the
+    ones that have logged in. Accounts deactivated before this migration
+    without ever logging in can't be told apart from unactivated ones.
+    """
+    User = apps.get_model("accounts", "User")
+    users = User.objects.using(schema_editor.connection.alias)
+    last_pk = users.order_by("-pk").values_list("pk", flat=True).first()
+    if last_pk is None:
+        return
+
+    start = 0
+    while start < last_pk:
+        end = start + BACKFILL_CHUNK_SIZE
+        users.filter(Q(is_active=True) | Q(last_login__isnull=False), pk__gt=start, pk__lte=end).update(
+            activated_at=Now(),
+        )
+        start = end
+
+
+class Migration(migrations.Migration):
+    # Let every backfill chunk commit separately instead of holding one
+    # long write transaction over the whole user table.
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0007_user_unactivated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='activated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Activated at'),
+        ),
+        migrations.RunPython(backfill_activated_at, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_unactivated_joined_idx',
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('activated_at__isnull', True), ('is_active', False), ('last_login__isnull', True)), fields=['date_joined'], name='user_unactivated_joined_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Stop before adding the constraint if emails differing only in case
+    belong to several accounts. Which account keeps the email is up to
+    the site's staff, so they are listed rather than changed.
+    """
+    User = apps.get_model("accounts", "User")
+    duplicates = list(
+        User.objects.using(schema_editor.connection.alias)
+        .values("email_lower")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+        .values_list("email_lower", flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Several accounts use these emails with different case, change "
+            "or delete all but one of each before migrating: " + ", ".join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_user_activated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='email_lower',
+            field=models.CharField(default='', editable=False, max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_usernames(apps, schema_editor):
+    """
+    Stop before adding the constraint if usernames differing only in case
+    belong to several accounts. Which account keeps the username is up to
+    the site's staff, so they are listed rather than changed.
+    """
+    User = apps.get_model("accounts", "User")
+    duplicates = list(
+        User.objects.using(schema_editor.connection.alias)
+        .values("username_lower")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+        .values_list("username_lower", flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Several accounts use these usernames with different case, rename "
+            "all but one of each before migrating: " + ", ".join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_usernames, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='username_lower',
+            field=models.CharField(default='', editable=False, max_length=15, unique=True),
+        ),
+    ]
@@ -1,38 +1,94 @@
 import random
 import string
+import threading
 
+from django.conf import settings
 from django.core.validators import MinLengthValidator
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.fields.related_descriptors import ReverseOneToOneDescriptor
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
+from .images import clean_profile_image, rendition_url, schedule_renditions
 from .managers import CustomUserManager
+from .user_cache import invalidate_cached_user
 from .validators import UsernameValidator, AgeValidator
 
 
+USERNAME_CHARACTERS = string.ascii_lowercase + string.digits
+
+# How many pre-checked usernames a process keeps for single-user saves.
+USERNAME_POOL_SIZE = 32
+
+# SQLite limits the number of parameters in one query.
+USERNAME_QUERY_CHUNK_SIZE = 500
+
+
 def generate_unique_random_username(length=15):
     """
-    Generate a unique random username of the given length.
+    Generate a random username of the given length that passes
+    UsernameValidator: it starts with a letter and has no underscores.
+    Uniqueness in the database is checked by allocate_usernames().
     """
-    characters = string.ascii_lowercase + string.digits + "_"
-    
-    # Generate a random username
-    random_username = "".join(random.choice(characters) for _ in range(length))
+    return random.choice(string.ascii_lowercase) + "".join(
+        random.choices(USERNAME_CHARACTERS, k=length - 1)
+    )
+
+
+def allocate_usernames(count, exclude=()):
+    """
+    Return a list of count random usernames that are not taken.
+    Candidates are drawn in batches and checked against the database with
+    one query per batch instead of one query per candidate, which makes
+    this suitable for bulk creation as well.
+    """
+    exclude = set(exclude)
+    usernames = []
+    while len(usernames) < count:
+        candidates = set()
+        while len(candidates) < count - len(usernames):
+            candidate = generate_unique_random_username()
+            if candidate not in exclude:
+                candidates.add(candidate)
+
+        candidates = list(candidates)
+        taken = set()
+        for start in range(0, len(candidates), USERNAME_QUERY_CHUNK_SIZE):
+            taken.update(
+                User.objects.filter(
+                    username_lower__in=candidates[start:start + USERNAME_QUERY_CHUNK_SIZE]
+                ).values_list("username_lower", flat=True)
+            )
+        for candidate in candidates:
+            if candidate not in taken:
+                usernames.append(candidate)
+            exclude.add(candidate)
+    return usernames
+
+
+class UsernamePool:
+    """
+    A per-process pool of pre-checked usernames, refilled with a single
+    query every USERNAME_POOL_SIZE allocations.
+    """
+    def __init__(self, size=USERNAME_POOL_SIZE):
+        self.size = size
+        self.usernames = []
+        self.lock = threading.Lock()
     
-    # Check valid username
-    while True:
-        # Check if the username starts or ends with an underscore.
-        if random_username.startswith("_") or random_username.endswith("_"):
-            random_username = "".join(random.choice(characters) for _ in range(length))
-            
-        # Check if the username starts with a digit.
-        if random_username[0].isdigit():
-            random_username = "".join(random.choice(characters) for _ in range(length))
+    def pop(self):
+        with self.lock:
+            if not self.usernames:
+                self.usernames = allocate_usernames(self.size)
+            return self.usernames.pop()
+
 
-        return random_username
+username_pool = UsernamePool()
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -53,6 +109,19 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(_("Is active"), default=False)
     is_staff = models.BooleanField(_("Staff status"), default=False)
     date_joined = models.DateField(_("Date joined"), default=timezone.now)
+    # Set the first time the account becomes active, so accounts that were
+    # deactivated later are never taken for unactivated ones.
+    activated_at = models.DateTimeField(_("Activated at"), null=True, blank=True, editable=False)
+    # Set on every save, read by the username index to pick up changes made
+    # by other processes. QuerySet.update() and bulk_update() calls that
+    # change usernames must set it too.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    # Lowercased copies of email and username, used for indexed
+    # case-insensitive lookups at login. Both are unique, so emails and
+    # usernames differing only in case can't belong to two accounts.
+    email_lower = models.CharField(max_length=254, unique=True, editable=False, default="")
+    username_lower = models.CharField(max_length=15, unique=True, editable=False, default="")
     
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -61,15 +130,47 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     class Meta:
         ordering = ["-date_joined"]
+        # Small partial index of the never-activated accounts, used by
+        # the purge_unactivated_users command.
+        indexes = [
+            models.Index(
+                fields=["date_joined"],
+                name="user_unactivated_joined_idx",
+                condition=Q(is_active=False, activated_at__isnull=True, last_login__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         return self.email
     
     def save(self, *args, **kwargs):
         if not self.username:
-            self.username = generate_unique_random_username()
+            self.username = username_pool.pop()
+        self.populate_lookup_keys()
+        if self.is_active and self.activated_at is None:
+            self.activated_at = timezone.now()
+        
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            update_fields.add("updated_at")
+            if "email" in update_fields:
+                update_fields.add("email_lower")
+            if "username" in update_fields:
+                update_fields.add("username_lower")
+            if "is_active" in update_fields:
+                update_fields.add("activated_at")
+            kwargs["update_fields"] = update_fields
         super().save(*args, **kwargs)
     
+    def populate_lookup_keys(self):
+        """
+        Refresh the lowercased lookup keys from email and username.
+        Call this before bulk_create()/bulk_update(), which bypass save().
+        """
+        self.email_lower = (self.email or "").lower()
+        self.username_lower = (self.username or "").lower()
+    
     def get_username(self):
         """Return the username for this User."""
         return self.username
@@ -80,6 +181,28 @@ class User(AbstractBaseUser, PermissionsMixin):
         
         
     
+class ProfileDescriptor(ReverseOneToOneDescriptor):
+    """
+    The user.profile accessor. With ACCOUNTS_LAZY_PROFILE enabled, if the
+    user has no profile row yet, it returns an unsaved default Profile
+    instead of raising, and the row is created on its first save().
+    Otherwise it behaves like the default accessor.
+    """
+    def __get__(self, instance, cls=None):
+        if instance is None or not getattr(settings, "ACCOUNTS_LAZY_PROFILE", False):
+            return super().__get__(instance, cls)
+        try:
+            return super().__get__(instance, cls)
+        except self.RelatedObjectDoesNotExist:
+            profile = self.related.related_model(user=instance)
+            self.related.set_cached_value(instance, profile)
+            return profile
+
+
+class ProfileField(models.OneToOneField):
+    related_accessor_class = ProfileDescriptor
+
+
 class Profile(models.Model):
     GENDER_CHOICES = [
         ("M", "Male"),
@@ -87,7 +210,7 @@ class Profile(models.Model):
         ("O", "Other"),
     ]
     
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
+    user = ProfileField(User, on_delete=models.CASCADE, related_name="profile")
     first_name = models.CharField(_("First name"), max_length=30, null=True)
     last_name = models.CharField(_("Last name"), max_length=30, null=True)
     profile_image = models.ImageField(_("Profile image"), upload_to="profile_image/", null=True, blank=True)
@@ -101,6 +224,45 @@ class Profile(models.Model):
     
     class Meta:
         ordering = ["-created_at"]
+        # Used by the admin's case-insensitive name prefix search.
+        indexes = [
+            models.Index(Lower("first_name"), name="profile_first_name_lower_idx"),
+            models.Index(Lower("last_name"), name="profile_last_name_lower_idx"),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if (
+            self._state.adding and not kwargs.get("force_insert")
+            and getattr(settings, "ACCOUNTS_LAZY_PROFILE", False)
+        ):
+            return self.save_lazy_profile(*args, **kwargs)
+        new_image = bool(self.profile_image) and not self.profile_image._committed
+        if new_image:
+            self.profile_image = clean_profile_image(self.profile_image)
+        super().save(*args, **kwargs)
+        if new_image:
+            image_name = self.profile_image.name
+            transaction.on_commit(lambda: schedule_renditions(image_name))
+    
+    def save_lazy_profile(self, *args, **kwargs):
+        """
+        First save of a profile returned by user.profile. Two requests can
+        both see no row and save at once, so the row is fetched or created
+        with get_or_create(), which falls back to fetching it when the
+        insert hits the unique user_id, and then updated with this
+        instance's values.
+        """
+        with transaction.atomic(using=kwargs.get("using")):
+            profile, _ = Profile.objects.using(kwargs.get("using")).get_or_create(user_id=self.user_id)
+            self.pk = profile.pk
+            self.created_at = profile.created_at
+            self._state.adding = False
+            self._state.db = profile._state.db
+            self.save(*args, **kwargs)
+    
+    def get_profile_image_url(self, size_name="small", fmt="webp"):
+        """Return the URL of a profile image rendition, see accounts.images."""
+        return rendition_url(self.profile_image, size_name, fmt)
     
     def get_full_name(self):
         """
@@ -121,6 +283,52 @@ class Profile(models.Model):
 def create_user_profile(sender, created, instance, **kwargs):
     """
     Create a profile for the user automatically when a new user is created.
+    With ACCOUNTS_LAZY_PROFILE enabled, the profile row is only created when
+    user.profile is first saved.
+    """
+    if created and not getattr(settings, "ACCOUNTS_LAZY_PROFILE", False):
+        Profile.objects.create(user=instance)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Drop the cached copy of the user whenever the user row changes,
+    including password changes and is_active flips.
     """
-    if created:
-        Profile.objects.create(user=instance)
\ No newline at end of file
+    invalidate_cached_user(instance.pk)
+
+
+class OutgoingEmail(models.Model):
+    """
+    An account email waiting in the outbox to be sent by the
+    send_queued_emails worker.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    
+    subject = models.CharField(_("Subject"), max_length=255)
+    body = models.TextField(_("Body"))
+    to_email = models.EmailField(_("Recipient"))
+    status = models.CharField(_("Status"), max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(_("Attempts"), default=0)
+    next_attempt_at = models.DateTimeField(_("Next attempt at"), default=timezone.now)
+    last_error = models.TextField(_("Last error"), blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ["next_attempt_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email}"
@@ -0,0 +1,115 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db.models import F
+from django.utils import timezone
+
+from .mailer import send_batch
+from .metrics import track
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+
+def queue_email(subject, body, to_email):
+    """
+    Store an email in the outbox. The row is committed immediately and
+    the send_queued_emails worker delivers it later.
+    """
+    with track("email"):
+        return OutgoingEmail.objects.create(subject=subject, body=body, to_email=to_email)
+
+
+def queue_emails(emails):
+    """Store many (subject, body, to_email) emails in the outbox with one INSERT per batch."""
+    with track("email"):
+        return OutgoingEmail.objects.bulk_create(
+            [OutgoingEmail(subject=subject, body=body, to_email=to_email) for subject, body, to_email in emails],
+            batch_size=500,
+        )
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to batch_size due emails for this worker.
+    Claimed rows have their next attempt pushed out by the lease time, so
+    other workers skip them until the lease expires.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=getattr(settings, "EMAIL_OUTBOX_LEASE", 300))
+    due = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.STATUS_PENDING,
+        next_attempt_at__lte=now,
+    )
+    ids = list(due.order_by("next_attempt_at").values_list("pk", flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    due.filter(pk__in=ids).update(next_attempt_at=lease_until)
+    return list(OutgoingEmail.objects.filter(pk__in=ids, next_attempt_at=lease_until))
+
+
+def retry_delay(attempts):
+    """Return the backoff before the next attempt, doubling on each failure."""
+    base = getattr(settings, "EMAIL_OUTBOX_RETRY_DELAY", 60)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def build_message(outgoing):
+    return EmailMessage(outgoing.subject, outgoing.body, to=[outgoing.to_email])
+
+
+def record_results(batch, result):
+    """
+    Store the outcome of a sent batch: the sent emails are marked in one
+    UPDATE, the failed ones are scheduled for a retry or given up on.
+    """
+    sent_ids = []
+    for outgoing, error in zip(batch, result.errors):
+        outgoing.attempts += 1
+        if error is None:
+            sent_ids.append(outgoing.pk)
+            continue
+        outgoing.last_error = repr(error)
+        if outgoing.attempts >= getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5):
+            outgoing.status = OutgoingEmail.STATUS_FAILED
+            logger.error("Giving up on email %s: %r", outgoing.pk, error)
+        else:
+            outgoing.next_attempt_at = timezone.now() + retry_delay(outgoing.attempts)
+            logger.warning("Sending email %s failed, retrying later: %r", outgoing.pk, error)
+        outgoing.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+    if sent_ids:
+        OutgoingEmail.objects.filter(pk__in=sent_ids).update(
+            status=OutgoingEmail.STATUS_SENT,
+            sent_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+
+
+def send_queued_emails(batch_size=None, connection=None, report=None):
+    """
+    Drain the due emails in the outbox, batch by batch, sending each batch
+    with send_messages() over a pooled connection, or over connection if
+    given. report, if given, is called with the BatchResult of every batch.
+    Returns a (sent, failed) tuple.
+    """
+    batch_size = batch_size or getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 100)
+    sent = failed = 0
+
+    # Claimed emails that are not sent because the worker dies are picked up
+    # again once their lease expires.
+    batch = claim_batch(batch_size)
+    while batch:
+        result = send_batch([build_message(outgoing) for outgoing in batch], connection)
+        record_results(batch, result)
+        sent += result.sent
+        failed += result.failed
+        if report is not None:
+            report(result)
+        batch = claim_batch(batch_size)
+    return sent, failed
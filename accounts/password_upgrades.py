@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+from .hashing import run_with_connection_cleanup
+from .models import User
+from .sqlite import run_write
+from .user_cache import get_user_cache, invalidate_cached_user, password_upgrade_key
+
+
+upgrade_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-upgrade")
+
+# Users with an upgrade queued, so repeated logins don't queue it again.
+pending_upgrades = set()
+pending_lock = threading.Lock()
+
+
+
+def upgrade_password(user_id, old_encoded, old_session_hash, raw_password):
+    """
+    Rehash a password with the preferred hasher and store it, unless the
+    password changed in the meantime. Sessions authenticated with the old
+    hash are moved onto the new one by rekey_upgraded_session().
+    Returns whether the password was upgraded.
+    """
+    try:
+        new_encoded = make_password(raw_password)
+        updated = run_write(
+            User.objects.filter(pk=user_id, password=old_encoded).update, password=new_encoded
+        )
+        if not updated:
+            return False
+        new_session_hash = User(pk=user_id, password=new_encoded).get_session_auth_hash()
+        get_user_cache().set(
+            password_upgrade_key(user_id), (old_session_hash, new_session_hash), settings.SESSION_COOKIE_AGE
+        )
+        invalidate_cached_user(user_id)
+        return True
+    finally:
+        with pending_lock:
+            pending_upgrades.discard(user_id)
+
+
+def schedule_password_upgrade(user, raw_password):
+    """
+    check_password() setter that queues the hash upgrade of a correct
+    password instead of saving the user during the login.
+    """
+    with pending_lock:
+        if user.pk in pending_upgrades:
+            return
+        pending_upgrades.add(user.pk)
+    upgrade_executor.submit(
+        run_with_connection_cleanup, upgrade_password,
+        user.pk, user.password, user.get_session_auth_hash(), raw_password,
+    )
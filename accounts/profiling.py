@@ -0,0 +1,112 @@
+import asyncio
+import cProfile
+import logging
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from .middleware import AsyncCapableMiddleware
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".prof"
+
+rotation_lock = threading.Lock()
+
+
+
+def get_profile_dir():
+    return Path(getattr(settings, "PROFILING_DIR", Path(settings.BASE_DIR) / "profiles"))
+
+
+def profile_filename(url_name, method, duration):
+    """Name a profile after its time, URL name, method and duration, so it sorts by age."""
+    safe_name = re.sub(r"[^A-Za-z0-9_-]", "_", url_name or "unresolved")
+    return f"{time.time_ns()}-{safe_name}-{method}-{int(duration * 1000)}ms{PROFILE_SUFFIX}"
+
+
+def rotate_profiles(directory, keep):
+    """Delete the oldest profiles so at most keep remain."""
+    with rotation_lock:
+        profiles = sorted(directory.glob(f"*{PROFILE_SUFFIX}"))
+        for path in profiles[:max(0, len(profiles) - keep)]:
+            path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Profiles a sample of requests with cProfile and writes the slow ones to
+    PROFILING_DIR. A request is profiled when it is picked at
+    PROFILING_SAMPLE_RATE, or carries PROFILING_HEADER set to PROFILING_TOKEN,
+    and its URL name is in PROFILING_URL_NAMES (all when empty). The profile
+    is kept when the request took at least PROFILING_MIN_DURATION seconds.
+    """
+    def resolve(self, request):
+        try:
+            return resolve(request.path_info)
+        except Resolver404:
+            return None
+
+    def should_profile(self, request, match=None):
+        token = getattr(settings, "PROFILING_TOKEN", None)
+        header = getattr(settings, "PROFILING_HEADER", "HTTP_X_PROFILE")
+        forced = bool(token) and request.META.get(header) == token
+        if not forced and random.random() >= getattr(settings, "PROFILING_SAMPLE_RATE", 0.01):
+            return False
+
+        url_names = getattr(settings, "PROFILING_URL_NAMES", [])
+        if url_names:
+            match = match or self.resolve(request)
+            return match is not None and match.url_name in url_names
+        return True
+
+    def handle(self, request):
+        if not getattr(settings, "PROFILING_ENABLED", False) or not self.should_profile(request):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            return await self.get_response(request)
+        match = self.resolve(request)
+        # cProfile only sees the thread it runs in, and coroutine views
+        # interleave with other requests on the event loop, so they aren't
+        # profiled.
+        if (match is not None and asyncio.iscoroutinefunction(match.func)) or not self.should_profile(
+            request, match
+        ):
+            return await self.get_response(request)
+        # Run the rest of the chain from a worker thread, so the sync view
+        # runs, and is profiled, in that thread.
+        return await sync_to_async(self.profile, thread_sensitive=False)(
+            request, async_to_sync(self.get_response)
+        )
+
+    def profile(self, request, get_response):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            return get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            if duration >= getattr(settings, "PROFILING_MIN_DURATION", 0):
+                self.save(profiler, request, duration)
+
+    def save(self, profiler, request, duration):
+        directory = get_profile_dir()
+        match = request.resolver_match
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(directory / profile_filename(match and match.url_name, request.method, duration))
+            rotate_profiles(directory, getattr(settings, "PROFILING_MAX_FILES", 200))
+        except OSError:
+            logger.exception("Writing the profile of %s failed", request.path)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Profile, User
+from .user_cache import invalidate_cached_users
+
+
+
+def get_purge_age():
+    """Seconds after signup an account that was never activated is purged."""
+    age = getattr(settings, "ACCOUNTS_PURGE_UNACTIVATED_AFTER", None)
+    return age if age is not None else settings.PASSWORD_RESET_TIMEOUT
+
+
+def unactivated_users(age=None):
+    """
+    Return the accounts that were never activated and joined more than age
+    seconds ago. Accounts that were activated or have logged in before were
+    deactivated on purpose and are kept, as are staff accounts.
+    """
+    age = get_purge_age() if age is None else age
+    # date_joined is a date, so only whole days before the cutoff count.
+    cutoff = (timezone.now() - timedelta(seconds=age)).date()
+    return User.objects.filter(
+        is_active=False,
+        activated_at__isnull=True,
+        last_login__isnull=True,
+        date_joined__lt=cutoff,
+        is_staff=False,
+        is_superuser=False,
+    )
+
+
+def purge_batch(queryset, batch_size):
+    """
+    Delete up to batch_size users of queryset and their profiles in one
+    short transaction and return the number of users deleted.
+    """
+    with transaction.atomic():
+        # Lock-free candidate read through the partial index, ordered so
+        # concurrent purges delete the same rows first.
+        pks = list(queryset.order_by("date_joined", "pk").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return 0
+        # Lock the candidates that still match, an account may have been
+        # activated since; activating one now waits for this transaction.
+        pks = list(queryset.filter(pk__in=pks).select_for_update().values_list("pk", flat=True))
+        Profile.objects.filter(user_id__in=pks).delete()
+        deleted = User.objects.filter(pk__in=pks).delete()[1].get(User._meta.label, 0)
+    invalidate_cached_users(pks)
+    return deleted
+
+
+def purge_unactivated_users(age=None, batch_size=None, report=None):
+    """
+    Delete the accounts returned by unactivated_users() batch by batch.
+    report, if given, is called with the running total after every batch.
+    Returns the number of users deleted.
+    """
+    batch_size = batch_size or getattr(settings, "ACCOUNTS_PURGE_BATCH_SIZE", 500)
+    queryset = unactivated_users(age)
+    total = 0
+    while True:
+        deleted = purge_batch(queryset, batch_size)
+        if not deleted:
+            return total
+        total += deleted
+        if report is not None:
+            report(total)
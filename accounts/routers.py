@@ -0,0 +1,122 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .middleware import AsyncCapableMiddleware
+
+
+PRIMARY_DATABASE = "default"
+
+# Cookie holding the time until which a client's reads stay on the primary.
+PIN_COOKIE = "primary_until"
+
+current_routing = ContextVar("accounts_db_routing", default=None)
+
+
+
+def get_replicas():
+    return getattr(settings, "REPLICA_DATABASES", [])
+
+
+class RoutingState:
+    """Routing state of one request, shared with the threads it hands work to."""
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of requests to a random REPLICA_DATABASES alias and
+    everything else to the primary.
+
+    Reads only go to a replica inside a request handled by
+    ReplicaRoutingMiddleware that hasn't written yet and whose client
+    hasn't written in the last REPLICA_STICKY_SECONDS, so clients read
+    their own writes despite replication lag. Management commands and
+    workers always use the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        replicas = get_replicas()
+        if state is None or state.pinned or not replicas:
+            return PRIMARY_DATABASE
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DATABASE, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication.
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Lets ReplicaRouter send the reads of a request to the replicas and
+    pins the client to the primary for REPLICA_STICKY_SECONDS after a
+    request that wrote.
+    """
+    def handle(self, request):
+        state = self.start(request)
+        token = current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so sync views share the state.
+        state = self.start(request)
+        token = current_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RoutingState(pinned)
+
+    def finish(self, state, response):
+        if state.wrote and get_replicas():
+            sticky = getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + sticky) + 1),
+                max_age=sticky + 1, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+def get_from_primary_if_missing(queryset, **lookup):
+    """
+    Get an object, falling back to the primary when it isn't on the replica
+    yet, e.g. an account activated from another device seconds after it
+    was created.
+    """
+    try:
+        return queryset.get(**lookup)
+    except queryset.model.DoesNotExist:
+        if queryset.db == PRIMARY_DATABASE:
+            raise
+        return queryset.using(PRIMARY_DATABASE).get(**lookup)
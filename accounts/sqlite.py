@@ -0,0 +1,144 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+
+def high_concurrency_enabled():
+    return getattr(settings, "SQLITE_HIGH_CONCURRENCY", False)
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    connection_created receiver tuning new SQLite connections for many
+    concurrent readers and writers: WAL lets readers run alongside the
+    writer, busy_timeout makes writers wait for the lock instead of failing,
+    and synchronous=NORMAL only syncs at checkpoints, which is safe in WAL.
+
+    Unless the database sets CONN_MAX_AGE, the connection is also kept for
+    SQLITE_CONN_MAX_AGE seconds, so the pragmas and the page cache aren't
+    thrown away at the end of every request.
+    """
+    if connection.vendor != "sqlite" or not high_concurrency_enabled():
+        return
+    if connection.settings_dict["CONN_MAX_AGE"] == 0:
+        # Django set close_at from CONN_MAX_AGE just before this signal.
+        connection.close_at = time.monotonic() + getattr(settings, "SQLITE_CONN_MAX_AGE", 60)
+    with connection.cursor() as cursor:
+        if not connection.is_in_memory_db():
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(getattr(settings, 'SQLITE_BUSY_TIMEOUT', 5000))}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{int(getattr(settings, 'SQLITE_CACHE_SIZE', 65536))}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+
+
+class WriteQueue:
+    """
+    Runs write jobs one after another in a single writer thread, so
+    threads queue in process instead of contending for the SQLite write
+    lock. Jobs waiting together are committed in one transaction, each in
+    its own savepoint so a failing job doesn't roll back the others.
+    """
+    def __init__(self):
+        self.jobs = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.thread = None
+
+    def is_writer(self):
+        return getattr(self.local, "is_writer", False)
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, contextvars.copy_context(), func, args, kwargs))
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="sqlite-writer", daemon=True)
+                self.thread.start()
+        return future
+
+    def run(self):
+        self.local.is_writer = True
+        batch_size = getattr(settings, "SQLITE_WRITE_BATCH_SIZE", 32)
+        while True:
+            batch = [self.jobs.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            self.run_batch(batch)
+
+    def lock_database(self):
+        """
+        Take the write lock before any job reads. A transaction that has
+        read can't wait for the lock once another connection commits, and
+        fails with "database is locked" regardless of busy_timeout.
+        """
+        connection = connections[DEFAULT_DB_ALIAS]
+        User = get_user_model()
+        table = connection.ops.quote_name(User._meta.db_table)
+        column = connection.ops.quote_name(User._meta.pk.column)
+        with connection.cursor() as cursor:
+            # Writes no row, but takes the lock like BEGIN IMMEDIATE.
+            cursor.execute(f"UPDATE {table} SET {column} = {column} WHERE 0")
+
+    def run_batch(self, batch):
+        close_old_connections()
+        outcomes = []
+        try:
+            with transaction.atomic():
+                self.lock_database()
+                for future, context, func, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, context.run(func, *args, **kwargs), None))
+                    except Exception as error:
+                        outcomes.append((future, None, error))
+        except Exception as error:
+            logger.exception("Committing a batch of %d writes failed", len(batch))
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        # Callers only hear back once their writes are committed.
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+write_queue = WriteQueue()
+
+
+def run_write(func, *args, **kwargs):
+    """
+    Call func, which writes to the default database, through the write
+    queue when the high-concurrency SQLite mode is on, and return its
+    result. Otherwise, and inside a transaction the job couldn't join,
+    func is called directly.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if (
+        not high_concurrency_enabled()
+        or connection.vendor != "sqlite"
+        or write_queue.is_writer()
+        or connection.in_atomic_block
+    ):
+        return func(*args, **kwargs)
+    return write_queue.submit(func, *args, **kwargs).result()
@@ -0,0 +1,15 @@
+from django import template
+
+from accounts.images import rendition_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_image_url(profile, size_name="small", fmt="webp"):
+    """
+    Return the URL of a profile image rendition, e.g.
+    {% profile_image_url user.profile "medium" %}
+    """
+    return rendition_url(profile.profile_image, size_name, fmt)
@@ -1,3 +1,1168 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import copy
+import csv
+import json
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+
+from . import async_views, changelists, urls
+from .admin import ProfileAdmin, UserAdmin
+from .benchmarks import BASELINE_PATH
+from .bulk import bulk_set_active
+from .export import iter_export
+from .forms import CustomUserChangeForm, CustomUserCreationForm
+from .images import clean_profile_image, generate_renditions, rendition_url
+from .last_login import LastLoginBuffer
+from .loadtest import ACTIVATION_LINK, LoadTestError, Mailbox, Recorder, percentile, run_flow
+from .mailer import ConnectionPool, send_batch
+from .metrics import MetricsMiddleware, registry
+from .models import OutgoingEmail, Profile, User, UsernamePool, allocate_usernames
+from .outbox import claim_batch, queue_email, retry_delay, send_queued_emails
+from .password_upgrades import upgrade_executor, upgrade_password
+from .profiling import ProfilingMiddleware, rotate_profiles
+from .purge import purge_unactivated_users
+from .routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .sqlite import configure_sqlite_connection, run_write, write_queue
+from .token import account_activation_token
+from .user_cache import get_user_cache, user_cache_key
+from .usernames import BloomFilter, UsernameIndex
+
+
+PASSWORD = "Test-Password-1"
+
+# Hashing at the production work factor would dominate the test run.
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class RefusingEmailBackend(EmailBackend):
+    """The locmem backend, refusing recipients at refused.example.com."""
+    def send_messages(self, messages):
+        sent = 0
+        for message in messages:
+            if message.to[0].endswith("@refused.example.com"):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b"No such user")})
+            sent += super().send_messages([message])
+        return sent
+
+
+class AsyncViewsURLConf:
+    """accounts.urls as served with ACCOUNTS_ASYNC_VIEWS enabled."""
+    urlpatterns = [
+        path("login/", async_views.login_view, name="login"),
+        path("register/", async_views.register_view, name="register"),
+        path("activate/<uidb64>/<token>/", async_views.activate, name="activate"),
+        path("password_reset", async_views.password_reset_request, name="password_reset"),
+        path("reset/<uidb64>/<token>/", async_views.password_reset_confirm, name="password_reset_confirm"),
+    ] + urls.urlpatterns
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates the accounts app back to migrate_from and forward again."""
+    migrate_from = None
+
+    def setUp(self):
+        self.migrate([self.migrate_from])
+        self.old_apps = MigrationExecutor(connection).loader.project_state([self.migrate_from]).apps
+
+    def tearDown(self):
+        self.migrate_to_latest()
+
+    def migrate(self, targets):
+        MigrationExecutor(connection).migrate(targets)
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LookupTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("Alice@Example.com", PASSWORD, username="alice1", is_active=True)
+
+    def test_filter_by_identifier_is_case_insensitive(self):
+        self.assertEqual(User.objects.filter_by_identifier("alice@example.COM").get(), self.user)
+        self.assertEqual(User.objects.filter_by_identifier("ALICE1").get(), self.user)
+        self.assertFalse(User.objects.filter_by_identifier("bob@example.com").exists())
+
+    def test_email_differing_in_case_is_rejected(self):
+        form = CustomUserCreationForm({
+            "email": "alice@example.com", "password1": PASSWORD, "password2": PASSWORD,
+        })
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()["email"][0].code, "unique")
+
+    def test_username_differing_in_case_is_rejected(self):
+        other = User.objects.create_user("bob@example.com", PASSWORD, username="bobby1")
+        form = CustomUserChangeForm(instance=other)
+        form.cleaned_data = {"username": "Alice1"}
+        with self.assertRaisesMessage(ValidationError, "A user with that username already exists."):
+            form.clean_username()
+
+    def test_lookup_keys_are_unique(self):
+        for email, username in [("ALICE@example.com", "bobby1"), ("bob@example.com", "ALICE1")]:
+            with self.subTest(email=email, username=username), self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    User.objects.create(email=email, username=username)
+
+    def test_saving_updates_the_lookup_keys(self):
+        self.user.email = "Alice.New@Example.com"
+        self.user.save(update_fields=["email"])
+        self.assertEqual(User.objects.get(pk=self.user.pk).email_lower, "alice.new@example.com")
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoginTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+
+    def login(self, username, password=PASSWORD):
+        return self.client.post("/login/", {"username": username, "password": password})
+
+    def test_login_by_email_in_any_case(self):
+        self.assertRedirects(self.login("ALICE@example.com"), "/")
+        self.assertEqual(self.client.get("/").status_code, 200)
+
+    def test_login_by_username(self):
+        self.assertRedirects(self.login("Alice1"), "/")
+
+    def test_wrong_password_is_rejected(self):
+        response = self.login("alice@example.com", "wrong")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_inactive_user_cant_log_in(self):
+        User.objects.create_user("bob@example.com", PASSWORD, username="bobby1")
+        self.assertEqual(self.login("bob@example.com").status_code, 200)
+
+
+class LookupKeysMigrationTests(MigrationTestCase):
+    migrate_from = ("accounts", "0002_auto_20230624_1745")
+
+    def test_backfill_lookup_keys(self):
+        OldUser = self.old_apps.get_model("accounts", "User")
+        OldUser.objects.create(email="Alice@Example.com", username="Alice1", password="!", date_joined=date(2020, 1, 1))
+        self.migrate_to_latest()
+        user = User.objects.get()
+        self.assertEqual((user.email_lower, user.username_lower), ("alice@example.com", "alice1"))
+
+
+class UniqueUsernameMigrationTests(MigrationTestCase):
+    migrate_from = ("accounts", "0010_user_updated_at")
+
+    def test_usernames_differing_in_case_stop_the_migration(self):
+        OldUser = self.old_apps.get_model("accounts", "User")
+        for email, username in [("a@example.com", "Alice1"), ("b@example.com", "alice1")]:
+            OldUser.objects.create(
+                email=email, email_lower=email, username=username, username_lower=username.lower(),
+                password="!", date_joined=date(2020, 1, 1),
+            )
+        with self.assertRaisesMessage(RuntimeError, "alice1"):
+            self.migrate([("accounts", "0011_user_username_lower_unique")])
+        OldUser.objects.filter(username="Alice1").delete()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SingleHashLoginTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+        self.verify = mock.patch.object(MD5PasswordHasher, "verify", autospec=True, side_effect=MD5PasswordHasher.verify)
+        self.encode = mock.patch.object(MD5PasswordHasher, "encode", autospec=True, side_effect=MD5PasswordHasher.encode)
+
+    def login(self, username):
+        with self.verify as verify, self.encode as encode:
+            response = self.client.post("/login/", {"username": username, "password": PASSWORD})
+        return response, verify.call_count, encode.call_count
+
+    def test_login_checks_the_password_once(self):
+        response, verified, _ = self.login("alice@example.com")
+        self.assertRedirects(response, "/")
+        self.assertEqual(verified, 1)
+
+    def test_unknown_user_costs_one_hash_too(self):
+        response, verified, encoded = self.login("nobody@example.com")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((verified, encoded), (0, 1))
+
+
+@override_settings(EMAIL_OUTBOX_RETRY_DELAY=60, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(TestCase):
+    def send(self):
+        return send_queued_emails(connection=RefusingEmailBackend())
+
+    def test_queued_email_is_sent_by_the_worker(self):
+        outgoing = queue_email("Subject", "Body", "alice@example.com")
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(self.send(), (1, 0))
+        self.assertEqual([message.to for message in mail.outbox], [["alice@example.com"]])
+        outgoing.refresh_from_db()
+        self.assertEqual((outgoing.status, outgoing.attempts), (OutgoingEmail.STATUS_SENT, 1))
+        self.assertIsNotNone(outgoing.sent_at)
+        self.assertEqual(self.send(), (0, 0))
+
+    def test_claimed_emails_are_leased(self):
+        queue_email("Subject", "Body", "alice@example.com")
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_failed_email_is_retried_with_backoff(self):
+        refused = queue_email("Subject", "Body", "bob@refused.example.com")
+        queue_email("Subject", "Body", "alice@example.com")
+
+        self.assertEqual(self.send(), (1, 1))
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), (OutgoingEmail.STATUS_PENDING, 1))
+        self.assertIn("SMTPRecipientsRefused", refused.last_error)
+        self.assertAlmostEqual(
+            refused.next_attempt_at, timezone.now() + timedelta(seconds=60), delta=timedelta(seconds=5)
+        )
+        # Not due yet.
+        self.assertEqual(self.send(), (0, 0))
+
+        OutgoingEmail.objects.filter(pk=refused.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.send(), (0, 1))
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), (OutgoingEmail.STATUS_FAILED, 2))
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual([retry_delay(attempts).total_seconds() for attempts in (1, 2, 3)], [60, 120, 240])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ImportUsersTests(TestCase):
+    def import_users(self, *lines, args=()):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as csv_file:
+            csv_file.write("\n".join(["email,password,username,first_name"] + list(lines)) + "\n")
+            csv_file.flush()
+            call_command("import_users", csv_file.name, "--workers", "1", *args, stdout=mock.Mock(), stderr=mock.Mock())
+
+    def test_import(self):
+        User.objects.create_user("alice@example.com", PASSWORD, username="alice1")
+        self.import_users(
+            f"Bob@Example.com,{PASSWORD},Bobby1,Bob",
+            f"ALICE@example.com,{PASSWORD},alice2,",
+            f"carol@example.com,{PASSWORD},ALICE1,",
+            f"dave@example.com,{PASSWORD},,",
+            "not-an-email,,,",
+        )
+        bob = User.objects.get(email="Bob@example.com")
+        self.assertEqual(bob.username, "bobby1")
+        self.assertTrue(bob.check_password(PASSWORD))
+        self.assertFalse(bob.is_active)
+        self.assertEqual(bob.profile.first_name, "Bob")
+        dave = User.objects.get(email="dave@example.com")
+        self.assertEqual(len(dave.username), 15)
+        self.assertEqual(User.objects.count(), 3)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class UsernameAllocationTests(TestCase):
+    def setUp(self):
+        User.objects.create_user("alice@example.com", PASSWORD, username="taken")
+
+    def test_allocated_usernames_are_free(self):
+        candidates = iter(["taken", "first", "excluded", "first", "second", "third"])
+        with mock.patch("accounts.models.generate_unique_random_username", lambda: next(candidates)):
+            with self.assertNumQueries(2):
+                usernames = allocate_usernames(2, exclude={"excluded"})
+        self.assertEqual(sorted(usernames), ["first", "second"])
+
+    def test_pool_refills_with_one_query(self):
+        pool = UsernamePool(size=3)
+        with self.assertNumQueries(1):
+            usernames = {pool.pop() for _ in range(3)}
+        self.assertEqual(len(usernames), 3)
+        with self.assertNumQueries(1):
+            pool.pop()
+
+    def test_user_without_username_gets_one_from_the_pool(self):
+        user = User.objects.create_user("bob@example.com", PASSWORD)
+        self.assertEqual(len(user.username), 15)
+        self.assertEqual(user.username_lower, user.username)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfileTests(TestCase):
+    def test_profile_is_created_with_the_user(self):
+        user = User.objects.create_user("alice@example.com", PASSWORD)
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        Profile.objects.filter(user=user).delete()
+        with self.assertRaises(Profile.DoesNotExist):
+            User.objects.get(pk=user.pk).profile
+
+    @override_settings(ACCOUNTS_LAZY_PROFILE=True)
+    def test_lazy_profile_is_created_on_first_save(self):
+        user = User.objects.create_user("alice@example.com", PASSWORD)
+        self.assertFalse(Profile.objects.exists())
+
+        profile = User.objects.get(pk=user.pk).profile
+        self.assertIsNone(profile.pk)
+        profile.first_name = "Alice"
+        profile.save()
+        self.assertEqual(Profile.objects.get(user=user).first_name, "Alice")
+
+    @override_settings(ACCOUNTS_LAZY_PROFILE=True)
+    def test_concurrent_first_saves_share_the_row(self):
+        user = User.objects.create_user("alice@example.com", PASSWORD)
+        first, second = User.objects.get(pk=user.pk).profile, User.objects.get(pk=user.pk).profile
+        first.first_name = "Alice"
+        first.save()
+        second.last_name = "Smith"
+        second.save()
+        self.assertEqual(Profile.objects.get().pk, first.pk)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(Profile.objects.get().last_name, "Smith")
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, LOGIN_THROTTLE_IDENTIFIER_LIMIT=3, LOGIN_THROTTLE_IP_LIMIT=5)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+
+    def login(self, username, password=PASSWORD):
+        return self.client.post("/login/", {"username": username, "password": password})
+
+    def test_failed_attempts_throttle_the_identifier(self):
+        for _ in range(3):
+            self.login("alice@example.com", "wrong")
+        # Even the right password is refused until the window passes.
+        response = self.login("Alice@Example.com")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("_auth_user_id", self.client.session)
+        self.assertContains(response, "Too many failed login attempts")
+
+    def test_failed_attempts_throttle_the_ip(self):
+        for number in range(5):
+            self.login(f"nobody{number}@example.com", "wrong")
+        self.assertContains(self.login("alice@example.com"), "Too many failed login attempts")
+
+    def test_throttled_attempts_skip_the_password_check(self):
+        for _ in range(3):
+            self.login("alice@example.com", "wrong")
+        with mock.patch.object(MD5PasswordHasher, "verify") as verify:
+            self.login("alice@example.com")
+        verify.assert_not_called()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncViewsTests(TransactionTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.client = AsyncClient()
+        self.user = User.objects.create_user("alice@example.com", PASSWORD, username="alice1")
+
+    def post(self, url, data):
+        # The multipart bodies Django 3.2's AsyncClient builds fail to
+        # parse, so post the form urlencoded.
+        return self.client.post(url, urlencode(data), content_type="application/x-www-form-urlencoded")
+
+    def link(self, name):
+        uid = urlsafe_base64_encode(force_bytes(self.user.pk))
+        return f"/{name}/{uid}/{account_activation_token.make_token(self.user)}/"
+
+    async def test_activate_and_log_in(self):
+        response = await self.client.get(self.link("activate"))
+        self.assertEqual(response.url, "/login/")
+        response = await self.post("/login/", {"username": "alice@example.com", "password": PASSWORD})
+        self.assertEqual((response.status_code, response.url), (302, "/"))
+
+    async def test_register(self):
+        response = await self.post("/register/", {
+            "email": "bob@example.com", "password1": PASSWORD, "password2": PASSWORD,
+        })
+        self.assertEqual(response.status_code, 302)
+        queued = await sync_to_async(OutgoingEmail.objects.filter(to_email="bob@example.com").count)()
+        self.assertEqual(queued, 1)
+
+    async def test_password_reset_confirm(self):
+        response = await self.post(self.link("reset"), {
+            "new_password1": "New-Password-2", "new_password2": "New-Password-2",
+        })
+        self.assertEqual(response.url, "/")
+        await sync_to_async(self.user.refresh_from_db)()
+        self.assertTrue(self.user.check_password("New-Password-2"))
+
+    async def test_invalid_link_is_rejected(self):
+        for uid in ["!!!", urlsafe_base64_encode(b"not-a-pk"), urlsafe_base64_encode(b"999")]:
+            with self.subTest(uid=uid):
+                response = await self.client.get(f"/reset/{uid}/token/")
+                self.assertEqual(response.url, "/")
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class UserCacheTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+        self.client.force_login(self.user)
+
+    def get_home(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/")
+        user_queries = [query for query in queries if User._meta.db_table in query["sql"]]
+        return response, user_queries
+
+    def test_cached_user_serves_requests_without_a_query(self):
+        response, user_queries = self.get_home()
+        self.assertEqual(response.context["user"], self.user)
+        self.assertEqual(len(user_queries), 1)
+        response, user_queries = self.get_home()
+        self.assertEqual(response.context["user"], self.user)
+        self.assertEqual(user_queries, [])
+
+    def test_saving_the_user_invalidates_the_cache(self):
+        self.get_home()
+        self.user.is_staff = True
+        self.user.save(update_fields=["is_staff"])
+        self.assertIsNone(get_user_cache().get(user_cache_key(self.user.pk)))
+        _, user_queries = self.get_home()
+        self.assertEqual(len(user_queries), 1)
+
+    def test_changed_password_logs_the_session_out(self):
+        self.get_home()
+        self.user.set_password("New-Password-2")
+        self.user.save()
+        response, _ = self.get_home()
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class UserChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin@example.com", PASSWORD, username="admin")
+        self.users = [
+            User.objects.create_user(f"user{number}@example.com", PASSWORD, username=f"user{number}")
+            for number in range(4)
+        ]
+        self.client.force_login(self.admin)
+
+    def changelist(self, query=""):
+        with mock.patch.object(UserAdmin, "list_per_page", 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/admin/accounts/user/{query}")
+        return response, [query["sql"] for query in queries]
+
+    def test_pages_by_primary_key(self):
+        response, queries = self.changelist()
+        cl = response.context["cl"]
+        self.assertEqual(cl.result_list, [self.users[3], self.users[2]])
+        self.assertEqual(cl.next_page_url, f"?after={self.users[2].pk}")
+        self.assertFalse(any("OFFSET" in sql for sql in queries))
+
+        response, _ = self.changelist(f"?after={self.users[0].pk}")
+        cl = response.context["cl"]
+        self.assertEqual(cl.result_list, [self.admin])
+        self.assertIsNone(cl.next_page_url)
+
+    def test_invalid_key_is_rejected(self):
+        response, _ = self.changelist("?after=x")
+        self.assertRedirects(response, "/admin/accounts/user/?e=1")
+
+    def test_unfiltered_count_is_estimated(self):
+        response, queries = self.changelist()
+        cl = response.context["cl"]
+        self.assertEqual(cl.result_count, self.users[3].pk)
+        self.assertTrue(cl.result_count_is_estimate)
+        self.assertFalse(any("COUNT(*)" in sql for sql in queries))
+
+    def test_filtered_count_is_capped(self):
+        response, _ = self.changelist("?is_active__exact=0")
+        cl = response.context["cl"]
+        self.assertEqual((cl.result_count, cl.result_count_is_estimate), (4, False))
+        with mock.patch.object(changelists, "COUNT_LIMIT", 3):
+            response, _ = self.changelist("?is_active__exact=0")
+        cl = response.context["cl"]
+        self.assertEqual((cl.result_count, cl.result_count_is_estimate), (3, True))
+
+    def test_search_matches_prefixes(self):
+        response, _ = self.changelist("?q=USER1")
+        self.assertEqual(response.context["cl"].result_list, [self.users[1]])
+        response, _ = self.changelist("?q=user2@")
+        self.assertEqual(response.context["cl"].result_list, [self.users[2]])
+        response, _ = self.changelist("?q=ser")
+        self.assertEqual(response.context["cl"].result_list, [])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfileSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin@example.com", PASSWORD, username="admin"))
+        self.profiles = {}
+        for email, first_name, last_name in [
+            ("alice@example.com", "Alice", "Van Dyke"),
+            ("bob@example.com", "Bob", "Alison"),
+            ("carol@example.org", "Carol", "Smith"),
+        ]:
+            user = User.objects.create_user(email, PASSWORD)
+            Profile.objects.filter(user=user).update(first_name=first_name, last_name=last_name)
+            self.profiles[first_name] = Profile.objects.get(user=user)
+
+    def search(self, term):
+        response = self.client.get("/admin/accounts/profile/", {"q": term})
+        return {profile.first_name for profile in response.context["cl"].result_list}
+
+    def test_words_match_name_or_email_prefixes(self):
+        self.assertEqual(self.search("ALI"), {"Alice", "Bob"})
+        self.assertEqual(self.search("ali smi"), set())
+        self.assertEqual(self.search("carol smi"), {"Carol"})
+        self.assertEqual(self.search("bob@"), {"Bob"})
+
+    def test_quoted_phrase_is_one_word(self):
+        self.assertEqual(self.search('"van dyke"'), {"Alice"})
+        self.assertEqual(self.search("van dyke"), set())
+
+    def test_email_words_only_match_emails(self):
+        Profile.objects.filter(pk=self.profiles["Bob"].pk).update(first_name="carol@example")
+        self.assertEqual(self.search("carol@example"), {"Carol"})
+
+    def test_search_uses_no_contains_lookups(self):
+        request = mock.Mock()
+        queryset, _ = ProfileAdmin(Profile, mock.Mock()).get_search_results(request, Profile.objects.all(), "ali")
+        self.assertNotIn("LIKE", str(queryset.query))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, PROFILE_IMAGE_MAX_SIZE=100, PROFILE_IMAGE_RENDITIONS={"small": 16})
+class ProfileImageTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def upload(self, size=(400, 200)):
+        exif = Image.Exif()
+        exif[0x010F] = "Camera maker"
+        output = BytesIO()
+        Image.new("RGB", size, "red").save(output, "JPEG", exif=exif)
+        return ContentFile(output.getvalue(), name="photo.jpg")
+
+    def test_upload_is_downscaled_and_stripped(self):
+        cleaned = clean_profile_image(self.upload())
+        self.assertRegex(cleaned.name, r"^[0-9a-f]{20}\.jpg$")
+        with Image.open(cleaned) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_renditions_are_generated_once(self):
+        name = default_storage.save("profile_image/photo.jpg", self.upload())
+        image = mock.Mock(url=default_storage.url(name))
+        image.name = name
+        self.assertEqual(rendition_url(image), image.url)
+
+        self.assertEqual(generate_renditions(name), 2)
+        self.assertEqual(generate_renditions(name), 0)
+        self.assertEqual(rendition_url(image), "/media/profile_image/renditions/photo/small.webp")
+        with default_storage.open("profile_image/renditions/photo/small.jpeg") as rendition, Image.open(rendition) as image:
+            self.assertEqual(image.size, (16, 16))
+
+    def test_saving_a_new_image_schedules_renditions(self):
+        profile = User.objects.create_user("alice@example.com", PASSWORD).profile
+        profile.profile_image = self.upload()
+        with mock.patch("accounts.models.schedule_renditions") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                profile.save()
+                profile.save()
+        schedule.assert_called_once_with(profile.profile_image.name)
+
+
+class BenchmarkBaselineTests(TestCase):
+    def setUp(self):
+        with open(BASELINE_PATH) as baseline_file:
+            self.baseline = json.load(baseline_file)
+
+    def benchmark(self, *args, meta=None, median_us=None):
+        results = copy.deepcopy(self.baseline)
+        results["meta"].update(meta or {})
+        if median_us is not None:
+            results["results"]["token_make"]["median_us"] = median_us
+        stderr = StringIO()
+        command = "accounts.management.commands.benchmark_accounts"
+        with mock.patch(f"{command}.run_benchmarks", return_value=results), \
+                mock.patch(f"{command}.setup_databases"), mock.patch(f"{command}.teardown_databases"):
+            call_command("benchmark_accounts", *args, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_committed_baseline_is_used_when_the_setup_matches(self):
+        self.assertEqual(self.benchmark(), "")
+        with self.assertRaisesMessage(CommandError, "token_make: median 1000.0us"):
+            self.benchmark(median_us=1000)
+
+    def test_committed_baseline_is_skipped_for_another_setup(self):
+        stderr = self.benchmark(meta={"hasher": "argon2", "dataset_size": 100}, median_us=1000)
+        self.assertIn("dataset_size 100 (baseline 10000), hasher 'argon2'", stderr)
+
+    def test_explicit_baseline_must_match(self):
+        with self.assertRaisesMessage(CommandError, "machine 'arm64' (baseline 'x86_64')"):
+            self.benchmark("--baseline", str(BASELINE_PATH), meta={"machine": "arm64"})
+
+
+class SynchronousMailbox(Mailbox):
+    """Sends the queued emails when a client waits for one, without a thread."""
+    def wait_for_link(self, to_email, pattern, timeout=30):
+        send_queued_emails(connection=EmailBackend())
+        return super().wait_for_link(to_email, pattern, timeout=0.1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoadTestTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.recorder = Recorder()
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.5), 3)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.99), 5)
+
+    def test_unexpected_response_fails_the_step(self):
+        self.recorder.request(self.client, "get", "/login/")
+        self.recorder.request(self.client, "get", "/", redirect_to="/login/?next=/")
+        with self.assertRaisesMessage(LoadTestError, "GET home returned 302 /login/?next=/, expected 200"):
+            self.recorder.request(self.client, "get", "/")
+        with self.assertRaisesMessage(LoadTestError, "expected a redirect to /"):
+            self.recorder.request(self.client, "get", "/login/", redirect_to="/")
+
+        summary = self.recorder.summary(1)
+        self.assertEqual((summary["GET home"]["requests"], summary["GET home"]["errors"]), (2, 1))
+        self.assertEqual((summary["GET login"]["requests"], summary["GET login"]["errors"]), (2, 1))
+
+    def test_flow_completes(self):
+        with mock.patch("accounts.loadtest.connections"):
+            run_flow(0, self.recorder, SynchronousMailbox())
+        self.assertEqual(sum(self.recorder.errors.values()), 0)
+        self.assertEqual(self.recorder.summary(1)["POST login"]["requests"], 2)
+        self.assertTrue(ACTIVATION_LINK.search(mail.outbox[0].body))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, ACCOUNTS_METRICS_ENABLED=True)
+class MetricsTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def metrics(self, **headers):
+        return self.client.get("/metrics/", REMOTE_ADDR="127.0.0.1", **headers)
+
+    def test_requests_are_recorded_per_view_and_method(self):
+        User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+        self.client.generic("PROPFIND", "/login/")
+        self.client.post("/login/", {"username": "alice@example.com", "password": PASSWORD})
+        body = self.metrics().content.decode()
+        self.assertIn('accounts_request_duration_seconds_count{view="login",method="other",status="200"} 1', body)
+        self.assertIn('accounts_request_duration_seconds_count{view="login",method="POST",status="302"} 1', body)
+        self.assertIn('accounts_operations_total{view="login",operation="template_render"} 1', body)
+        self.assertRegex(body, r'accounts_operations_total\{view="login",operation="sql"\} [1-9]')
+
+    def test_metrics_are_restricted(self):
+        self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="10.0.0.1").status_code, 403)
+        self.assertEqual(self.metrics().status_code, 200)
+        with override_settings(ACCOUNTS_METRICS_TOKEN="secret"):
+            self.assertEqual(self.metrics().status_code, 403)
+            self.assertEqual(self.metrics(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.assertEqual(self.metrics(HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+    def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse(status=201)
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('{view="-",method="GET",status="201"} 1', registry.render())
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = Path(profile_dir.name)
+        profiling_settings = override_settings(
+            PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir, PROFILING_SAMPLE_RATE=0,
+            PROFILING_TOKEN="secret", PROFILING_URL_NAMES=[], PROFILING_MIN_DURATION=0,
+        )
+        profiling_settings.enable()
+        self.addCleanup(profiling_settings.disable)
+
+    def profiles(self):
+        return sorted(path.name for path in self.profile_dir.glob("*.prof"))
+
+    def test_requests_with_the_token_are_profiled(self):
+        self.client.get("/login/")
+        self.client.get("/login/", HTTP_X_PROFILE="wrong")
+        self.assertEqual(self.profiles(), [])
+        self.client.get("/login/", HTTP_X_PROFILE="secret")
+        [name] = self.profiles()
+        self.assertRegex(name, r"^\d+-login-GET-\d+ms\.prof$")
+
+    def test_url_names_and_min_duration_filter_profiles(self):
+        with override_settings(PROFILING_URL_NAMES=["register"]):
+            self.client.get("/login/", HTTP_X_PROFILE="secret")
+        with override_settings(PROFILING_MIN_DURATION=60):
+            self.client.get("/login/", HTTP_X_PROFILE="secret")
+        self.assertEqual(self.profiles(), [])
+
+    def test_oldest_profiles_are_rotated(self):
+        for number in range(5):
+            (self.profile_dir / f"{number}-login-GET-1ms.prof").touch()
+        rotate_profiles(self.profile_dir, 2)
+        self.assertEqual(self.profiles(), ["3-login-GET-1ms.prof", "4-login-GET-1ms.prof"])
+
+    def test_async_chain_profiles_sync_views(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().get("/login/", HTTP_X_PROFILE="secret")
+        with mock.patch.object(ProfilingMiddleware, "save") as save:
+            asyncio.run(middleware(request))
+        save.assert_called_once()
+
+
+class DisconnectingEmailBackend(EmailBackend):
+    """The locmem backend, failing the first send like a connection the server dropped."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.disconnects = 1
+
+    def send_messages(self, messages):
+        if self.disconnects:
+            self.disconnects -= 1
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+class MailerTests(TestCase):
+    def messages(self, *recipients):
+        return [EmailMessage("Subject", "Body", to=[recipient]) for recipient in recipients]
+
+    def test_failed_message_is_skipped(self):
+        result = send_batch(
+            self.messages("a@example.com", "b@refused.example.com", "c@example.com"),
+            RefusingEmailBackend(),
+        )
+        self.assertEqual((result.sent, result.failed, result.reconnects), (2, 1, 1))
+        self.assertIsInstance(result.errors[1], smtplib.SMTPRecipientsRefused)
+        self.assertEqual([message.to for message in mail.outbox], [["a@example.com"], ["c@example.com"]])
+
+    def test_dropped_connection_is_retried_once(self):
+        result = send_batch(self.messages("a@example.com", "b@example.com"), DisconnectingEmailBackend())
+        self.assertEqual((result.sent, result.reconnects), (2, 1))
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_POOL_SIZE=1, EMAIL_POOL_MAX_IDLE=60)
+    def test_pool_reuses_idle_connections(self):
+        pool = ConnectionPool()
+        first, reused = pool.acquire()
+        self.assertFalse(reused)
+        second, _ = pool.acquire()
+        pool.release(first)
+        with mock.patch.object(second, "close") as close:
+            pool.release(second)
+        close.assert_called_once_with()
+        self.assertEqual(pool.acquire(), (first, True))
+
+        pool.release(first)
+        with mock.patch("accounts.mailer.time.monotonic", return_value=time.monotonic() + 61):
+            with mock.patch.object(first, "close") as close:
+                connection, reused = pool.acquire()
+        close.assert_called_once_with()
+        self.assertIsNot(connection, first)
+        self.assertFalse(reused)
+
+    def test_unreachable_server_fails_the_batch(self):
+        with mock.patch("accounts.mailer.pool.acquire", side_effect=ConnectionRefusedError):
+            result = send_batch(self.messages("a@example.com", "b@example.com"))
+        self.assertEqual((result.sent, result.failed), (0, 2))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, USERNAME_INDEX_MIN_CAPACITY=100, USERNAME_INDEX_REFRESH=5)
+class UsernameIndexTests(TestCase):
+    def setUp(self):
+        User.objects.create_user("alice@example.com", PASSWORD, username="alice1")
+        self.index = UsernameIndex()
+        # Tests build in their own thread, which sees the test's transaction.
+        thread = mock.patch("accounts.usernames.threading.Thread")
+        self.thread = thread.start()
+        self.addCleanup(thread.stop)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(100, 0.01)
+        bloom.add("alice1")
+        bloom.add("alice1")
+        self.assertIn("alice1", bloom)
+        self.assertNotIn("bobby1", bloom)
+        self.assertEqual(bloom.count, 1)
+
+    def test_database_is_checked_until_the_filter_is_built(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.index.is_taken("ALICE1"))
+        self.thread.return_value.start.assert_called_once_with()
+
+        self.index.build()
+        with self.assertNumQueries(1):
+            # The first check reads the changes made during the build.
+            self.assertFalse(self.index.is_taken("bobby1"))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.index.is_taken("bobby1"))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.index.is_taken("Alice1"))
+
+    def test_refresh_reads_other_processes_changes_outside_the_lock(self):
+        self.index.build()
+        self.index.ensure_current()
+        User.objects.filter(username="alice1").update(
+            username="bobby1", username_lower="bobby1", updated_at=timezone.now(),
+        )
+        self.index.refreshed_at -= 10
+
+        def changed_usernames(updated_since):
+            self.assertFalse(self.index.lock.locked())
+            return UsernameIndex.changed_usernames(self.index, updated_since)
+
+        with mock.patch.object(self.index, "changed_usernames", side_effect=changed_usernames) as changed:
+            self.assertTrue(self.index.is_taken("bobby1"))
+        changed.assert_called_once()
+        self.assertFalse(self.index.refreshing)
+
+    def test_failed_build_falls_back_to_the_database(self):
+        with mock.patch.object(self.index, "build", side_effect=RuntimeError("boom")), \
+                mock.patch("accounts.usernames.connection"), self.assertLogs("accounts.usernames", "ERROR"):
+            self.index.run_build()
+        self.assertIsNone(self.index.filter)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.index.is_taken("alice1"))
+        # The build isn't retried on every check.
+        self.thread.assert_not_called()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+        Profile.objects.filter(user=self.alice).update(first_name="Alice", bio='Says "hi",\nthen leaves')
+        self.bob = User.objects.create_user("bob@example.com", PASSWORD, username="bobby1")
+        Profile.objects.filter(user=self.bob).delete()
+        self.alice.refresh_from_db()
+
+    def test_csv(self):
+        rows = list(csv.DictReader(iter_export(User.objects.all(), "csv")))
+        self.assertEqual([row["email"] for row in rows], ["alice@example.com", "bob@example.com"])
+        self.assertEqual((rows[0]["first_name"], rows[0]["bio"]), ("Alice", 'Says "hi",\nthen leaves'))
+        self.assertEqual((rows[1]["first_name"], rows[1]["last_login"]), ("", ""))
+
+    def test_jsonl_reads_in_primary_key_chunks(self):
+        with self.assertNumQueries(3):
+            lines = list(iter_export(User.objects.all(), "jsonl", chunk_size=1))
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["id"] for row in rows], [self.alice.pk, self.bob.pk])
+        self.assertEqual((rows[0]["is_active"], rows[0]["date_joined"]), (True, self.alice.date_joined.isoformat()))
+        self.assertIsNone(rows[1]["first_name"])
+
+    def test_export_view_requires_staff_permission(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get("/export/users/").status_code, 302)
+        admin = User.objects.create_superuser("admin@example.com", PASSWORD, username="admin")
+        self.client.force_login(admin)
+        response = self.client.get("/export/users/", {"format": "jsonl"})
+        self.assertEqual(response["Content-Type"], "application/jsonl")
+        self.assertEqual(len(list(response.streaming_content)), 3)
+        self.assertEqual(self.client.get("/export/users/", {"format": "xml"}).status_code, 404)
+
+    def test_command_writes_active_users(self):
+        with tempfile.NamedTemporaryFile("r", suffix=".csv") as output:
+            stdout = StringIO()
+            call_command("export_users", "--output", output.name, "--active-only", stdout=stdout)
+            rows = list(csv.DictReader(output))
+        self.assertEqual([row["email"] for row in rows], ["alice@example.com"])
+        self.assertIn("Exported 1 user(s)", stdout.getvalue())
+
+
+@override_settings(REPLICA_DATABASES=["replica"], REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.reads = []
+
+    def view(self, write=False):
+        def get_response(request):
+            self.reads.append(self.router.db_for_read(User))
+            if write:
+                self.router.db_for_write(User)
+                self.reads.append(self.router.db_for_read(User))
+            return HttpResponse()
+        return get_response
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(User), "default")
+        self.assertEqual(self.router.db_for_write(User), "default")
+
+    def test_write_pins_the_request_and_the_client(self):
+        response = ReplicaRoutingMiddleware(self.view(write=True))(RequestFactory().post("/"))
+        self.assertEqual(self.reads, ["replica", "default"])
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], 11)
+        self.assertGreater(float(cookie.value), time.time() + 10)
+
+        request = RequestFactory().get("/")
+        request.COOKIES[PIN_COOKIE] = cookie.value
+        response = ReplicaRoutingMiddleware(self.view())(request)
+        self.assertEqual(self.reads[2:], ["default"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_expired_or_invalid_pin_is_ignored(self):
+        for value in [str(int(time.time()) - 1), "x"]:
+            request = RequestFactory().get("/")
+            request.COOKIES[PIN_COOKIE] = value
+            ReplicaRoutingMiddleware(self.view())(request)
+        self.assertEqual(self.reads, ["replica", "replica"])
+
+    def test_async_chain_shares_the_state_with_sync_views(self):
+        get_response = sync_to_async(self.view(write=True))
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().post("/")))
+        self.assertEqual(self.reads, ["replica", "default"])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(SQLITE_HIGH_CONCURRENCY=True, SQLITE_CONN_MAX_AGE=60)
+class WriteQueueTests(TransactionTestCase):
+    def test_writes_run_in_the_writer_thread(self):
+        def create():
+            User.objects.create(email="queued@example.com")
+            return threading.current_thread().name
+
+        self.assertEqual(run_write(create), "sqlite-writer")
+        self.assertTrue(User.objects.filter(email="queued@example.com").exists())
+
+    def test_failing_job_only_rolls_back_itself(self):
+        def fail():
+            User.objects.create(email="failed@example.com")
+            raise ValueError("job failed")
+
+        jobs = [
+            (User.objects.create, {"email": "first@example.com"}),
+            (fail, {}),
+            (User.objects.create, {"email": "third@example.com"}),
+        ]
+        batch = [(Future(), contextvars.copy_context(), func, (), kwargs) for func, kwargs in jobs]
+        with CaptureQueriesContext(connection) as queries:
+            write_queue.run_batch(batch)
+
+        # The batch takes the write lock before any job reads.
+        self.assertEqual(queries[0]["sql"], "BEGIN")
+        self.assertIn("WHERE 0", queries[1]["sql"])
+        self.assertEqual(batch[0][0].result().email, "first@example.com")
+        with self.assertRaisesMessage(ValueError, "job failed"):
+            batch[1][0].result()
+        self.assertEqual(
+            set(User.objects.values_list("email", flat=True)), {"first@example.com", "third@example.com"}
+        )
+
+    def test_writes_inside_a_transaction_run_directly(self):
+        with transaction.atomic():
+            self.assertEqual(run_write(lambda: threading.current_thread().name), threading.current_thread().name)
+
+    def test_connections_are_kept_unless_configured(self):
+        with mock.patch.object(connection, "close_at", None):
+            with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0):
+                configure_sqlite_connection(sender=None, connection=connection)
+            self.assertAlmostEqual(connection.close_at, time.monotonic() + 60, delta=5)
+
+            # Persistent connections without a limit stay that way.
+            connection.close_at = None
+            with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=None):
+                configure_sqlite_connection(sender=None, connection=connection)
+            self.assertIsNone(connection.close_at)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PurgeTests(TestCase):
+    def create(self, email, **fields):
+        return User.objects.create(email=email, date_joined=date(2020, 1, 1), **fields)
+
+    def test_only_never_activated_accounts_are_purged(self):
+        unactivated = self.create("new@example.com")
+        deactivated = self.create("gone@example.com")
+        bulk_set_active(User.objects.filter(pk=deactivated.pk), True)
+        bulk_set_active(User.objects.filter(pk=deactivated.pk), False)
+        staff = self.create("staff@example.com", is_staff=True)
+        recent = User.objects.create(email="recent@example.com")
+
+        self.assertEqual(purge_unactivated_users(batch_size=1), 1)
+        self.assertFalse(User.objects.filter(pk=unactivated.pk).exists())
+        self.assertFalse(Profile.objects.filter(user_id=unactivated.pk).exists())
+        self.assertEqual(
+            set(User.objects.values_list("pk", flat=True)), {deactivated.pk, staff.pk, recent.pk}
+        )
+        self.assertEqual(Profile.objects.count(), 3)
+
+    def test_purges_in_batches(self):
+        for i in range(5):
+            self.create(f"new{i}@example.com")
+        reports = []
+        self.assertEqual(purge_unactivated_users(batch_size=2, report=reports.append), 5)
+        self.assertEqual(reports, [2, 4, 5])
+
+    def test_accounts_imported_as_active_are_kept_after_deactivation(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as csv_file:
+            csv_file.write(f"email,password\nalice@example.com,{PASSWORD}\n")
+            csv_file.flush()
+            call_command("import_users", csv_file.name, "--active", "--workers", "1", stdout=StringIO(), stderr=StringIO())
+        user = User.objects.get()
+        self.assertIsNotNone(user.activated_at)
+
+        call_command("bulk_users", "deactivate", "--ids", str(user.pk), stdout=StringIO())
+        User.objects.filter(pk=user.pk).update(date_joined=date(2020, 1, 1))
+        call_command("purge_unactivated_users", "--age", "0", stdout=StringIO())
+        self.assertFalse(User.objects.get(pk=user.pk).is_active)
+
+
+class ActivatedAtMigrationTests(MigrationTestCase):
+    migrate_from = ("accounts", "0007_user_unactivated_index")
+
+    def test_backfill_activated_at(self):
+        OldUser = self.old_apps.get_model("accounts", "User")
+        for email, fields in [
+            ("active@example.com", {"is_active": True}),
+            ("deactivated@example.com", {"last_login": timezone.now()}),
+            ("new@example.com", {}),
+        ]:
+            OldUser.objects.create(
+                email=email, email_lower=email, username=email[:8], username_lower=email[:8],
+                password="!", date_joined=date(2020, 1, 1), **fields,
+            )
+        self.migrate([("accounts", "0008_user_activated_at")])
+        activated = dict(User.objects.values_list("email", "activated_at"))
+        self.assertIsNotNone(activated["active@example.com"])
+        self.assertIsNotNone(activated["deactivated@example.com"])
+        # Not active and never logged in: not known to have been activated.
+        self.assertIsNone(activated["new@example.com"])
+
+
+def write_directly(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, ACCOUNTS_COALESCE_LAST_LOGIN=True, LAST_LOGIN_FLUSH_THRESHOLD=3)
+class LastLoginTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+        # Flushes run in the test's thread, which sees the test's transaction.
+        thread = mock.patch("accounts.last_login.threading.Thread")
+        self.thread = thread.start()
+        self.addCleanup(thread.stop)
+        self.buffer = LastLoginBuffer()
+        buffer = mock.patch("accounts.last_login.last_login_buffer", self.buffer)
+        buffer.start()
+        self.addCleanup(buffer.stop)
+
+    def test_login_doesnt_update_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/login/", {"username": "alice@example.com", "password": PASSWORD})
+        self.assertRedirects(response, "/")
+        self.assertFalse(any(query["sql"].startswith("UPDATE") and "last_login" in query["sql"] for query in queries))
+        self.assertIsNone(User.objects.get(pk=self.user.pk).last_login)
+        self.assertEqual(list(self.buffer.pending), [self.user.pk])
+        self.thread.return_value.start.assert_called_once_with()
+
+    def test_flush_writes_the_latest_timestamps(self):
+        other = User.objects.create_user("bob@example.com", PASSWORD, username="bobby1")
+        earlier, later = timezone.now() - timedelta(minutes=1), timezone.now()
+        self.buffer.add(self.user.pk, later)
+        self.buffer.add(self.user.pk, earlier)
+        self.buffer.add(other.pk, earlier)
+
+        self.assertEqual(self.buffer.flush(write=write_directly), 2)
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_login, later)
+        self.assertEqual(User.objects.get(pk=other.pk).last_login, earlier)
+        self.assertEqual(self.buffer.flush(write=write_directly), 0)
+
+    def test_failed_flush_keeps_the_timestamps(self):
+        now = timezone.now()
+        self.buffer.add(self.user.pk, now)
+        with self.assertLogs("accounts.last_login", "ERROR"):
+            self.assertEqual(self.buffer.flush(write=mock.Mock(side_effect=RuntimeError)), 0)
+        self.assertEqual(self.buffer.pending, {self.user.pk: now})
+
+    def test_threshold_triggers_an_early_flush(self):
+        for user_id in range(2):
+            self.buffer.add(user_id, timezone.now())
+        self.assertFalse(self.buffer.due.is_set())
+        self.buffer.add(2, timezone.now())
+        self.assertTrue(self.buffer.due.is_set())
+
+    def test_flush_thread_stops_at_shutdown(self):
+        self.buffer.stopped.set()
+        self.buffer.due.set()
+        with mock.patch.object(self.buffer, "flush") as flush:
+            self.buffer.run()
+        # shutdown() writes what is left itself.
+        flush.assert_not_called()
+
+
+@override_settings(
+    PASSWORD_HASHERS=["accounts.hashers.PBKDF2PasswordHasher"],
+    ACCOUNTS_DEFER_PASSWORD_UPGRADES=True,
+    PASSWORD_PBKDF2_ITERATIONS=2000,
+)
+class DeferredPasswordUpgradeTests(TransactionTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            self.user = User.objects.create_user("alice@example.com", PASSWORD, username="alice1", is_active=True)
+
+    def test_upgrade_keeps_the_session(self):
+        self.assertRedirects(self.client.post("/login/", {"username": "alice@example.com", "password": PASSWORD}), "/")
+        # The single upgrade worker runs jobs in order.
+        upgrade_executor.submit(lambda: None).result()
+
+        self.assertTrue(User.objects.get(pk=self.user.pk).password.startswith("pbkdf2_sha256$2000$"))
+        self.assertEqual(self.client.get("/").status_code, 200)
+
+    def test_changed_password_isnt_overwritten(self):
+        old_encoded = self.user.password
+        self.user.set_password("Other-Password-2")
+        self.user.save(update_fields=["password"])
+        self.assertFalse(upgrade_password(self.user.pk, old_encoded, "", PASSWORD))
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password("Other-Password-2"))
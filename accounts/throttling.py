@@ -0,0 +1,108 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+
+
+
+class LoginThrottled(PermissionDenied):
+    """Raised when a login attempt is rejected by the throttle."""
+    pass
+
+
+class SlidingWindowLimiter:
+    """
+    Approximate sliding window counter stored in a Django cache.
+    Each key is counted in fixed buckets of `window` seconds, and the
+    previous bucket is weighted by how much of it still overlaps the
+    window ending now. Works with the local-memory cache as well as with
+    a shared cache such as Redis or Memcached.
+    """
+    def __init__(self, prefix, limit, window, cache_alias="default"):
+        self.prefix = prefix
+        self.limit = limit
+        self.window = window
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def bucket_keys(self, key, now):
+        bucket = int(now // self.window)
+        current = f"{self.prefix}:{key}:{bucket}"
+        previous = f"{self.prefix}:{key}:{bucket - 1}"
+        return current, previous, (now % self.window) / self.window
+
+    def count(self, key, now=None):
+        current, previous, elapsed = self.bucket_keys(key, now or time.time())
+        values = self.cache.get_many([current, previous])
+        return values.get(previous, 0) * (1 - elapsed) + values.get(current, 0)
+
+    def is_limited(self, key):
+        return self.count(key) >= self.limit
+
+    def hit(self, key):
+        current, _previous, _elapsed = self.bucket_keys(key, time.time())
+        # Keep each bucket around long enough to be read as the previous one.
+        self.cache.add(current, 0, timeout=self.window * 2)
+        try:
+            self.cache.incr(current)
+        except ValueError:
+            # The bucket expired or was evicted between add() and incr().
+            self.cache.set(current, 1, timeout=self.window * 2)
+
+
+class LoginThrottle:
+    """
+    Limits failed login attempts per identifier and per client IP.
+    Checks only read the cache, so over-limit attempts are rejected before
+    any user query or password hash.
+    """
+    def get_limiter(self, scope, limit_setting, default_limit):
+        return SlidingWindowLimiter(
+            f"login-throttle:{scope}",
+            getattr(settings, limit_setting, default_limit),
+            getattr(settings, "LOGIN_THROTTLE_WINDOW", 300),
+            getattr(settings, "LOGIN_THROTTLE_CACHE", "default"),
+        )
+
+    @property
+    def identifiers(self):
+        return self.get_limiter("identifier", "LOGIN_THROTTLE_IDENTIFIER_LIMIT", 10)
+
+    @property
+    def ips(self):
+        return self.get_limiter("ip", "LOGIN_THROTTLE_IP_LIMIT", 50)
+
+    @staticmethod
+    def identifier_key(identifier):
+        # Hash identifiers so arbitrary user input is a safe cache key.
+        return hashlib.sha256(identifier.lower().encode()).hexdigest()
+
+    @staticmethod
+    def get_ip(request):
+        if request is None:
+            return None
+        return request.META.get("REMOTE_ADDR")
+
+    def check(self, request, identifier):
+        """Raise LoginThrottled if the identifier or the client IP is over the limit."""
+        if not getattr(settings, "LOGIN_THROTTLE_ENABLED", True):
+            return
+        ip = self.get_ip(request)
+        if self.identifiers.is_limited(self.identifier_key(identifier)) or (ip and self.ips.is_limited(ip)):
+            raise LoginThrottled
+
+    def record_failure(self, request, identifier):
+        if not getattr(settings, "LOGIN_THROTTLE_ENABLED", True):
+            return
+        self.identifiers.hit(self.identifier_key(identifier))
+        ip = self.get_ip(request)
+        if ip:
+            self.ips.hit(ip)
+
+
+login_throttle = LoginThrottle()
@@ -1,16 +1,25 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import views, async_views
+from .metrics import metrics_view
 
 
+# Serve the async versions of the login, registration, activation and
+# password reset views when running under ASGI.
+account_views = async_views if getattr(settings, "ACCOUNTS_ASYNC_VIEWS", False) else views
+
 urlpatterns = [
-    path("login/", views.login_view, name="login"),
-    path("register/", views.register_view, name="register"),
+    path("login/", account_views.login_view, name="login"),
+    path("register/", account_views.register_view, name="register"),
     path("logout/", views.logout_view, name="logout"),
     path("", views.home, name="home"),
-    path("activate/<uidb64>/<token>/", views.activate, name="activate"),
+    path("activate/<uidb64>/<token>/", account_views.activate, name="activate"),
     path("resend_confirmation/", views.resend_confirmation_email, name="resend_confirmation"),
     path("password_change", views.password_change, name="password_change"),
-    path("password_reset", views.password_reset_request, name="password_reset"),
-    path("reset/<uidb64>/<token>/", views.password_reset_confirm, name="password_reset_confirm"),
+    path("password_reset", account_views.password_reset_request, name="password_reset"),
+    path("reset/<uidb64>/<token>/", account_views.password_reset_confirm, name="password_reset_confirm"),
+    path("username_available/", views.username_available, name="username_available"),
+    path("export/users/", views.export_users, name="export_users"),
+    path("metrics/", metrics_view, name="metrics"),
 ]
\ No newline at end of file
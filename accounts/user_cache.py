@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+
+
+def get_user_cache():
+    return caches[getattr(settings, "USER_CACHE_ALIAS", "default")]
+
+
+def user_cache_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """Drop a user from the cache, called whenever the user row is saved or deleted."""
+    if user_id is not None:
+        get_user_cache().delete(user_cache_key(user_id))
+
+
+def invalidate_cached_users(user_ids):
+    """Drop many users from the cache at once, for bulk updates that skip User.save."""
+    get_user_cache().delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+def password_upgrade_key(user_id):
+    return f"accounts:password-upgrade:{user_id}"
+
+
+def rekey_upgraded_session(request, user_id):
+    """
+    Move a session authenticated with a password hash that has since been
+    upgraded in the background onto the new hash, so the upgrade doesn't
+    log the user out. See accounts.password_upgrades.
+    """
+    hashes = get_user_cache().get(password_upgrade_key(user_id))
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if hashes and session_hash and constant_time_compare(session_hash, hashes[0]):
+        request.session[HASH_SESSION_KEY] = hashes[1]
+
+
+def get_cached_user(request):
+    """
+    Return the user for the request's session like django.contrib.auth.get_user,
+    but serve it from the cache when possible.
+
+    A cached user is only used if the session's auth hash still matches
+    it, so a changed password logs other sessions out as usual. Anything
+    unexpected falls back to django.contrib.auth.get_user, which loads the
+    user from the database and caches it for the next request.
+    """
+    try:
+        user_id = request.session[SESSION_KEY]
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+
+    cache = get_user_cache()
+    key = user_cache_key(user_id)
+    if backend_path in settings.AUTHENTICATION_BACKENDS:
+        user = cache.get(key)
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if user is not None and session_hash and constant_time_compare(
+            session_hash, user.get_session_auth_hash()
+        ):
+            user.backend = backend_path
+            return user
+
+    rekey_upgraded_session(request, user_id)
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, user, getattr(settings, "USER_CACHE_TIMEOUT", 300))
+    return user
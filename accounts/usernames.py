@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Usernames read per query while building the index.
+INDEX_BUILD_CHUNK_SIZE = 5000
+
+# Rows changed this long before the last read are read again, so writes
+# committed late, or stamped by a host with a skewed clock, aren't missed.
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+# Seconds to wait before building again after a build failed.
+BUILD_RETRY_DELAY = 60
+
+
+
+class BloomFilter:
+    """
+    A fixed size set of strings that answers "definitely absent" or "maybe
+    present", with false positives at about error_rate once capacity
+    strings have been added.
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        added = False
+        for position in self.positions(value):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                self.bits[position >> 3] |= 1 << (position & 7)
+                added = True
+        # Values added again, e.g. by overlapping refreshes, aren't counted.
+        if added:
+            self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class UsernameIndex:
+    """
+    A per-process Bloom filter of the lowercased usernames in use.
+
+    The filter is built in a background thread on first use; until it is
+    ready, or when building it failed, every check goes to the database. It
+    is extended by User saves in this process, and at most once every
+    USERNAME_INDEX_REFRESH seconds by reading the users whose updated_at
+    changed since the last read, which picks up creations and renames by
+    other processes. Old names can't be removed from a Bloom filter, so the
+    whole filter is rebuilt in the background every USERNAME_INDEX_REBUILD
+    seconds; until then they only cause a database check.
+
+    The lock only guards the in-memory state, queries run without it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.builder = None
+        self.refreshing = False
+        self.updated_since = None
+        self.built_at = self.refreshed_at = 0.0
+        self.build_failed_at = None
+
+    def build(self):
+        """Build a filter from the whole user table and swap it in."""
+        User = get_user_model()
+        started = timezone.now()
+        min_capacity = getattr(settings, "USERNAME_INDEX_MIN_CAPACITY", 100000)
+        capacity = max(min_capacity, 2 * User.objects.count())
+        bloom = BloomFilter(capacity, getattr(settings, "USERNAME_INDEX_ERROR_RATE", 0.01))
+        rows = User.objects.order_by().values_list("username_lower", flat=True)
+        for username in rows.iterator(chunk_size=INDEX_BUILD_CHUNK_SIZE):
+            bloom.add(username)
+        with self.lock:
+            self.filter = bloom
+            self.updated_since = started - REFRESH_OVERLAP
+            self.built_at = time.monotonic()
+            self.build_failed_at = None
+            # Read the changes made during the scan before the next answer.
+            self.refreshed_at = 0.0
+
+    def run_build(self):
+        try:
+            self.build()
+        except Exception:
+            # Checks keep using the previous filter, or the database when
+            # there is none, until a build succeeds.
+            logger.exception("Building the username index failed")
+            with self.lock:
+                self.build_failed_at = time.monotonic()
+        finally:
+            connection.close()
+            with self.lock:
+                self.builder = None
+
+    def start_build(self):
+        """
+        Start building a filter, unless already building or a build failed
+        less than BUILD_RETRY_DELAY seconds ago. Call with the lock held.
+        """
+        if self.builder is not None:
+            return
+        if self.build_failed_at is not None and time.monotonic() - self.build_failed_at < BUILD_RETRY_DELAY:
+            return
+        self.builder = threading.Thread(target=self.run_build, name="username-index", daemon=True)
+        self.builder.start()
+
+    def changed_usernames(self, updated_since):
+        User = get_user_model()
+        return list(
+            User.objects.filter(updated_at__gte=updated_since).order_by().values_list("username_lower", flat=True)
+        )
+
+    def refresh(self, bloom, updated_since):
+        """Add the usernames changed since updated_since to bloom."""
+        started = timezone.now()
+        try:
+            usernames = self.changed_usernames(updated_since)
+        finally:
+            with self.lock:
+                self.refreshing = False
+        with self.lock:
+            for username in usernames:
+                bloom.add(username)
+            # A rebuild may have swapped in a newer filter meanwhile.
+            if self.filter is bloom:
+                self.updated_since = started - REFRESH_OVERLAP
+                self.refreshed_at = time.monotonic()
+
+    def ensure_current(self):
+        """
+        Return the filter to check, or None while there is none. One caller
+        at a time reads the changes made by other processes, the others use
+        the filter as it is meanwhile.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if (
+                self.filter is None
+                or self.filter.count > self.filter.capacity
+                or now - self.built_at > getattr(settings, "USERNAME_INDEX_REBUILD", 3600)
+            ):
+                self.start_build()
+            bloom, updated_since = self.filter, self.updated_since
+            refresh = (
+                bloom is not None and not self.refreshing
+                and now - self.refreshed_at > getattr(settings, "USERNAME_INDEX_REFRESH", 5)
+            )
+            if refresh:
+                self.refreshing = True
+        if refresh:
+            self.refresh(bloom, updated_since)
+        return bloom
+
+    def add(self, username):
+        """Add a saved username, if the filter has been built."""
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(username)
+
+    def is_taken(self, username):
+        """Return whether the username is used, case-insensitively."""
+        username = username.lower()
+        bloom = self.ensure_current()
+        if bloom is not None and username not in bloom:
+            return False
+        # Maybe present, or no filter to check: ask the database.
+        return get_user_model().objects.filter(username_lower=username).exists()
+
+
+username_index = UsernameIndex()
+
+
+def index_saved_username(sender, instance, **kwargs):
+    """post_save receiver keeping the index current with this process's saves."""
+    username_index.add(instance.username_lower)
@@ -1,14 +1,16 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout, authenticate
-from django.contrib.auth.decorators import login_required
-from django.template.loader import render_to_string
+from django.contrib.auth import login, logout
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.sites.shortcuts import get_current_site
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.utils.encoding import force_bytes, force_str
-from django.core.mail import EmailMessage
+from django.utils.http import urlsafe_base64_decode
+from django.utils.encoding import force_str
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
 
 from .forms import (
     UserLoginForm,
@@ -17,7 +19,13 @@ from .forms import (
     CustomPasswordResetForm,
 )
 from .decorators import user_not_authenticated
+from .export import EXPORT_FORMATS, export_response
+from .emails import render_confirmation_email, render_password_reset_email
+from .outbox import queue_email
+from .routers import get_from_primary_if_missing
+from .sqlite import run_write
 from .token import account_activation_token
+from .usernames import username_index
 
 
 UserModel = get_user_model()
@@ -25,21 +33,24 @@ UserModel = get_user_model()
 
 
 def send_confirmation_email(request, user, to_email):
-    """Sends a confirmation email to the user."""
-    mail_subject = "Activate your account"
-    message = render_to_string("activate_email.html", {
-        "user": user,
-        "domain": get_current_site(request).domain,
-        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
-        "token": account_activation_token.make_token(user),
-        # "protocol": "https" if request.is_secure else "http",
-    })
-    email = EmailMessage(mail_subject, message, to=[to_email])
-    if email.send():
-        messages.success(request, f"Please check your email inbox <b>{to_email}</b> and click \
-            on the activation link to confirm your registration. <strong>Note</strong>: Check your spam folder.")
-    else:
-        messages.error(request, f"Problem sending email to {to_email}, check if you typed it correctly.")
+    """Queues a confirmation email to the user in the outbox."""
+    subject, message = render_confirmation_email(user, get_current_site(request).domain)
+    queue_email(subject, message, to_email)
+    messages.success(request, f"Please check your email inbox <b>{to_email}</b> and click \
+        on the activation link to confirm your registration. <strong>Note</strong>: Check your spam folder.")
+
+
+def send_password_reset_email(request, user):
+    """Queues a password reset email to the user in the outbox."""
+    subject, message = render_password_reset_email(user, get_current_site(request).domain)
+    queue_email(subject, message, user.email)
+    messages.success(request, "Your password reset sent. <strong>Note</strong>: Check your spam folder.")
+
+
+def create_account(request, user):
+    """Save a new user and queue the confirmation email."""
+    user.save()
+    send_confirmation_email(request, user, user.email)
 
 
 def activate(request, uidb64, token):
@@ -55,13 +66,14 @@ def activate(request, uidb64, token):
     """
     try:
         uid = force_str(urlsafe_base64_decode(uidb64))
-        user = UserModel.objects.get(pk=uid)
+        user = get_from_primary_if_missing(UserModel.objects.all(), pk=uid)
     except:
         user = None
         
     if user is not None and account_activation_token.check_token(user, token):
         user.is_active = True
-        user.save()
+        # The user may come from a replica, only write the changed column.
+        run_write(user.save, update_fields=["is_active"])
         messages.success(
             request,
             "Your account has been successfully verified. "
@@ -78,8 +90,7 @@ def resend_confirmation_email(request):
     user_info = request.session.get("user_info")
     if user_info:
         try:
-            user = UserModel.objects.get(Q(email=user_info) | Q(username=user_info))
-            print(user_info)
+            user = UserModel.objects.filter_by_identifier(user_info).get()
             send_confirmation_email(request, user, user.email)
             request.session.pop("user_info")
             return redirect("/")
@@ -94,17 +105,13 @@ def login_view(request):
     next_url = None
     
     if request.method == "POST":
-        form = UserLoginForm(data=request.POST)
+        form = UserLoginForm(request, data=request.POST)
         if form.is_valid():
-            # log in the user
-            username=form.cleaned_data["username"]
-            password=form.cleaned_data["password"]
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, "You have successfully logged in.")
-                next_url = request.POST.get("next")
-                return redirect(next_url or "/")
+            # log in the user verified by the form
+            login(request, form.get_user())
+            messages.success(request, "You have successfully logged in.")
+            next_url = request.POST.get("next")
+            return redirect(next_url or "/")
         else:
             handle_auth_error(request, form)
         
@@ -117,8 +124,9 @@ def register_view(request):
     if request.method == "POST":
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            send_confirmation_email(request, user, user.email)
+            # save(commit=False) only hashes the password, outside the write queue.
+            user = form.save(commit=False)
+            run_write(create_account, request, user)
             return redirect("/")
         
     return render(request, "register-page.html", {"form": form})
@@ -144,22 +152,9 @@ def password_reset_request(request):
         form = CustomPasswordResetForm(request.POST)
         if form.is_valid():
             user_email = form.cleaned_data["email"]
-            print(user_email)
             user = UserModel.objects.filter(Q(email=user_email)).first()
-            print(user.pk)
             if user:
-                subject = "Password reset request"
-                message = render_to_string("template_reset_password.html", {
-                    "user": user,
-                    "domain": get_current_site(request).domain,
-                    "uid": urlsafe_base64_encode(force_bytes(user.pk)),
-                    "token": account_activation_token.make_token(user),
-                })
-                email = EmailMessage(subject, message, to=[user.email])
-                if email.send():
-                    messages.success(request, "Your password reset sent. <strong>Note</strong>: Check your spam folder.")
-                else:
-                    messages.error(request, "Problem sending reset password email, <b>SERVER PROBLEM</b>")
+                send_password_reset_email(request, user)
             return redirect("/")
     
     return render(request, "password_reset.html", {"form": form})
@@ -168,7 +163,7 @@ def password_reset_request(request):
 def password_reset_confirm(request, uidb64, token):
     try:
         uid = force_str(urlsafe_base64_decode(uidb64))
-        user = UserModel.objects.get(pk=uid)
+        user = get_from_primary_if_missing(UserModel.objects.all(), pk=uid)
     except:
         user = None
         
@@ -177,7 +172,8 @@ def password_reset_confirm(request, uidb64, token):
         if request.method == "POST":
             form = CustomSetPasswordForm(user, request.POST)
             if form.is_valid():
-                form.save()
+                form.save(commit=False)
+                user.save(update_fields=["password"])
                 messages.success(request, "Your password has been set. You may go ahead and <b>log in </b> now.")
                 return redirect("/")
 
@@ -198,12 +194,46 @@ def handle_auth_error(request, form):
                 url = "<a href='/resend_confirmation' class='alert-link'>Click</a>"
                 messages.warning(request, f"Your account is inactive. \
                     Please {url} to send the confirmation link.")
+            elif error.code == "throttled":
+                messages.error(request, error.message)
             # else:
             #     message = error.message
             #     params = error.params
             #     messages.error(request, message if not params else message % params)
 
 
+@require_GET
+def username_available(request):
+    """
+    Check a username as it is typed: returns whether it passes the username
+    validators and, if it does, whether it is still free. Most free names
+    are answered from the in-process username index without a query.
+    """
+    username = request.GET.get("username", "").strip()
+    if not username:
+        return JsonResponse({"username": username, "valid": False, "available": False, "errors": []})
+
+    try:
+        UserModel._meta.get_field("username").run_validators(username)
+    except ValidationError as error:
+        return JsonResponse({
+            "username": username, "valid": False, "available": False, "errors": error.messages,
+        })
+
+    available = not username_index.is_taken(username)
+    return JsonResponse({"username": username, "valid": True, "available": available, "errors": []})
+
+
+@staff_member_required
+@permission_required("accounts.view_user", raise_exception=True)
+def export_users(request):
+    """Stream all users joined with their profiles as ?format=csv (default) or jsonl."""
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export format")
+    return export_response(UserModel.objects.all(), fmt)
+
+
 @login_required
 def home(request):
     return render(request, 'home-page.html')           
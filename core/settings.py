@@ -42,11 +42,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.metrics.MetricsMiddleware',
+    'accounts.profiling.ProfilingMiddleware',
+    'accounts.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +58,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'accounts.metrics.InstrumentedDjangoTemplates',
         'DIRS': [ BASE_DIR / 'templates' ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,9 +82,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # A local read-only "replica" of the SQLite database, add its alias to
+    # REPLICA_DATABASES to route request reads to it:
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+    #     'OPTIONS': {'uri': True},
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+# High-concurrency SQLite mode: WAL, tuned pragmas and an in-process
+# queue for registration and activation writes, see accounts/sqlite.py
+SQLITE_HIGH_CONCURRENCY = False
+SQLITE_BUSY_TIMEOUT = 5000    # millisecond
+SQLITE_CACHE_SIZE = 65536    # KiB
+SQLITE_WRITE_BATCH_SIZE = 32    # queued writes committed together
+SQLITE_CONN_MAX_AGE = 60    # second, connections are kept unless CONN_MAX_AGE is set
+
+# Request reads go to a random replica, see accounts/routers.py
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+REPLICA_DATABASES = []
+REPLICA_STICKY_SECONDS = 10    # reads stay on the primary this long after a write
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -121,6 +145,10 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Uploaded files (profile images and their renditions)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -129,9 +157,85 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # user model config
 AUTH_USER_MODEL = 'accounts.User'
 AUTHENTICATION_BACKENDS = ["accounts.backends.CustomBackend"]
+# Django's default hashers, timed for the request metrics
+PASSWORD_HASHERS = [
+    "accounts.hashers.PBKDF2PasswordHasher",
+    "accounts.hashers.PBKDF2SHA1PasswordHasher",
+    "accounts.hashers.Argon2PasswordHasher",
+    "accounts.hashers.BCryptSHA256PasswordHasher",
+]
+# hasher work factors, None for Django's defaults, see `manage.py calibrate_hashers`
+PASSWORD_PBKDF2_ITERATIONS = None
+PASSWORD_ARGON2_TIME_COST = None
+PASSWORD_ARGON2_MEMORY_COST = None    # KiB
+PASSWORD_BCRYPT_ROUNDS = None
+# Rehash outdated password hashes in the background instead of during login
+ACCOUNTS_DEFER_PASSWORD_UPGRADES = False
+
+# rows per UPDATE in the bulk user admin actions and `manage.py bulk_users`
+ACCOUNTS_BULK_CHUNK_SIZE = 1000
+# rows read per query by the user exports
+ACCOUNTS_EXPORT_CHUNK_SIZE = 2000
+# `manage.py purge_unactivated_users` deletes never-activated accounts after
+ACCOUNTS_PURGE_UNACTIVATED_AFTER = None    # second, defaults to PASSWORD_RESET_TIMEOUT
+ACCOUNTS_PURGE_BATCH_SIZE = 500
+# domain used in the links of emails queued outside of a request
+ACCOUNTS_EMAIL_DOMAIN = "localhost:8000"
+
+# in-process index behind /username_available/, see accounts/usernames.py
+USERNAME_INDEX_ERROR_RATE = 0.01
+USERNAME_INDEX_MIN_CAPACITY = 100000    # usernames
+USERNAME_INDEX_REFRESH = 5    # second, reads users changed by other processes
+USERNAME_INDEX_REBUILD = 3600    # second
+
+# Create Profile rows on the first save of user.profile instead of on signup
+ACCOUNTS_LAZY_PROFILE = False
+
+# profile image processing, see accounts/images.py
+PROFILE_IMAGE_MAX_SIZE = 1024    # pixel, longest side of the stored original
+PROFILE_IMAGE_RENDITIONS = {"small": 64, "medium": 256}    # square, pixel
+PROFILE_IMAGE_WORKERS = 2
+
+# Serve the async account views (for ASGI deployments)
+ACCOUNTS_ASYNC_VIEWS = False
+# Threads used to hash passwords in the async views, defaults to the CPU count
+PASSWORD_HASHING_THREADS = None
+
+# cache for request.user, use a shared cache when running several processes
+USER_CACHE_ALIAS = "default"
+USER_CACHE_TIMEOUT = 300    # second
+
+# request metrics, scraped from /metrics/
+ACCOUNTS_METRICS_ENABLED = True
+ACCOUNTS_METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+# behind a reverse proxy on the same host every request comes from 127.0.0.1,
+# so set a token and configure Prometheus to send it as a bearer token
+ACCOUNTS_METRICS_TOKEN = None
+
+# request profiling, summarized by `manage.py summarize_profiles`
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.01    # fraction of requests
+PROFILING_URL_NAMES = []    # url names from accounts/urls.py, empty for all
+PROFILING_MIN_DURATION = 0    # second, faster requests are discarded
+PROFILING_HEADER = "HTTP_X_PROFILE"    # always profile requests sending PROFILING_TOKEN in it
+PROFILING_TOKEN = None
+PROFILING_DIR = BASE_DIR / "profiles"
+PROFILING_MAX_FILES = 200
+
+# Buffer last_login on login and write it in bulk, see accounts/last_login.py
+ACCOUNTS_COALESCE_LAST_LOGIN = False
+LAST_LOGIN_FLUSH_INTERVAL = 30    # second
+LAST_LOGIN_FLUSH_THRESHOLD = 1000    # buffered logins that trigger an early flush
 
 # login url
 LOGIN_URL = "/login/"
+
+# login throttling, failed attempts per sliding window
+LOGIN_THROTTLE_ENABLED = True
+LOGIN_THROTTLE_CACHE = "default"
+LOGIN_THROTTLE_WINDOW = 300    # second
+LOGIN_THROTTLE_IDENTIFIER_LIMIT = 10
+LOGIN_THROTTLE_IP_LIMIT = 50
 # LOGIN_REDIRECT_URL = '/login/'
 
 # email config
@@ -141,4 +245,13 @@ EMAIL_HOST_USER = "example@gmial.com"
 EMAIL_HOST_PASSWORD = "Your password"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
-PASSWORD_RESET_TIMEOUT = 3600    # second
\ No newline at end of file
+PASSWORD_RESET_TIMEOUT = 3600    # second
+
+# email outbox config, drained by `manage.py send_queued_emails`
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60    # second, doubled after every failed attempt
+EMAIL_OUTBOX_LEASE = 300    # second
+# open SMTP connections reused between batches, per process
+EMAIL_POOL_SIZE = 2
+EMAIL_POOL_MAX_IDLE = 60    # second
\ No newline at end of file